@@ -0,0 +1,124 @@
+"""Vectorized simulator stepping many games in lockstep
+
+BatchMinesweeper holds B boards as stacked (B, width, height) arrays and applies one move per board per step,
+so evaluating an AI or generating training data on thousands of games needs no Python loop over boards.
+"""
+import numpy as np
+
+from boards import sample_mine_bitmaps
+from engine import FLAGGED, HIDDEN, MINE_VALUE
+
+
+def get_neighbour_counts(mines):
+    """Returns int8 counts of adjacent mines for a (B, width, height) bool array, one padded sum"""
+    width, height = mines.shape[1:]
+    padded = np.pad(mines, ((0, 0), (1, 1), (1, 1))).astype(np.int8)
+    counts = np.zeros(mines.shape, dtype=np.int8)
+    for i in range(3):
+        for j in range(3):
+            if i != 1 or j != 1:
+                counts += padded[:, i:i + width, j:j + height]
+    return counts
+
+
+def dilate(mask):
+    """Returns mask grown by one square in all 8 directions"""
+    width, height = mask.shape[1:]
+    padded = np.pad(mask, ((0, 0), (1, 1), (1, 1)))
+    grown = np.zeros(mask.shape, dtype=np.bool_)
+    for i in range(3):
+        for j in range(3):
+            grown |= padded[:, i:i + width, j:j + height]
+    return grown
+
+
+class BatchMinesweeper:
+    """B Minesweeper games stored as stacked arrays and stepped together
+
+    mine_fields uses the ArrayMinesweeper encoding (counts, MINE_VALUE for mines). Finished games are replaced
+    by fresh boards after each step when auto_reset is set.
+    """
+
+    def __init__(self, batch_size, width, height, mines, seed=None, auto_reset=True):
+        assert mines < width * height, 'More mines than boxes'
+
+        self.batch_size = batch_size
+        self.width = width
+        self.height = height
+        self.mines = mines
+        self.auto_reset = auto_reset
+        self.rng = np.random.RandomState(seed)
+
+        self.mine_fields = np.zeros((batch_size, width, height), dtype=np.int8)
+        self.revealed_boxes = np.zeros((batch_size, width, height), dtype=np.bool_)
+        self.flagged_mines = np.zeros((batch_size, width, height), dtype=np.bool_)
+        self.new_games(np.ones(batch_size, dtype=np.bool_))
+
+    def new_games(self, games):
+        """Deals fresh boards to the games selected by a (B,) bool mask"""
+        count = np.count_nonzero(games)
+        if not count:
+            return
+
+        mines = sample_mine_bitmaps(self.rng, count, self.width, self.height, self.mines)
+        mines = mines.reshape(count, self.width, self.height)
+        fields = get_neighbour_counts(mines)
+        fields[mines] = MINE_VALUE
+
+        self.mine_fields[games] = fields
+        self.revealed_boxes[games] = False
+        self.flagged_mines[games] = False
+
+    def available_info(self):
+        """Returns (B, width, height) int8 observations in the Minesweeper.available_info encoding"""
+        info = np.where(self.revealed_boxes, self.mine_fields, np.int8(HIDDEN))
+        info[self.flagged_mines] = FLAGGED
+        return info
+
+    def get_revealed_counts(self):
+        """Returns (B,) counts of revealed boxes that are not mines"""
+        return np.count_nonzero(self.revealed_boxes & (self.mine_fields != MINE_VALUE), axis=(1, 2))
+
+    def step(self, moves, flags=None):
+        """Applies one move per game and returns (info, won, lost, revealed fraction)
+
+        moves is a (B, 2) array of x, y squares; where the optional (B,) bool flags is set the move toggles a flag
+        instead of revealing. won, lost and the revealed fraction describe the games as they ended this step,
+        while info already shows the fresh boards of finished games if auto_reset is set.
+        """
+        games = np.arange(self.batch_size)
+        x, y = np.asarray(moves).T
+        flags = np.zeros(self.batch_size, dtype=np.bool_) if flags is None else np.asarray(flags)
+
+        toggles = flags & ~self.revealed_boxes[games, x, y]
+        self.flagged_mines[games[toggles], x[toggles], y[toggles]] ^= True
+
+        reveals = ~flags & ~self.revealed_boxes[games, x, y]
+        lost = reveals & (self.mine_fields[games, x, y] == MINE_VALUE)
+        self.revealed_boxes[games[reveals], x[reveals], y[reveals]] = True
+
+        # flood fill every game that revealed a 0 at once, one ring of neighbours per iteration
+        filling = games[reveals][self.mine_fields[games[reveals], x[reveals], y[reveals]] == 0]
+        if len(filling):
+            fields = self.mine_fields[filling]
+            revealed = self.revealed_boxes[filling]
+            opened = np.zeros(revealed.shape, dtype=np.bool_)
+            opened[np.arange(len(filling)), x[filling], y[filling]] = True
+            while opened.any():
+                grown = dilate(opened) & ~revealed
+                revealed |= grown
+                opened = grown & (fields == 0)
+            self.revealed_boxes[filling] = revealed
+
+        # like show_mines, a lost game reveals all of its mines
+        self.revealed_boxes[lost] |= self.mine_fields[lost] == MINE_VALUE
+
+        revealed_counts = self.get_revealed_counts()
+        safe_count = self.width * self.height - self.mines
+        won = ~lost & (revealed_counts >= safe_count)
+        revealed_fraction = revealed_counts / safe_count
+
+        if self.auto_reset:
+            self.new_games(won | lost)
+
+        return self.available_info(), won, lost, revealed_fraction
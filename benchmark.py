@@ -0,0 +1,252 @@
+"""Headless AI benchmark: plays seeded games per difficulty across a process pool and writes a JSON report
+
+    python benchmark.py --games 10000 --difficulty beginner expert --output report.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+
+import boards
+import engine
+import metrics
+import replay
+import solver
+from engine import DIFFICULTIES
+from metrics import LATENCY_BUCKET_COUNT, latency_bucket, latency_percentile
+
+LATENCY_PERCENTILES = (50, 90, 99, 99.9)
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_REPORT_FILENAME = 'benchmark.json'
+
+# games kept by each worker process, one per (difficulty, engine), so chunks of any difficulty reuse warm games
+GAMES = {}
+
+
+def new_stats():
+    """Returns empty game statistics"""
+    return {
+        'games': 0,
+        'wins': 0,
+        'revealed_fraction': 0.0,
+        'moves': 0,
+        'latency_histogram': [0] * LATENCY_BUCKET_COUNT,
+        'metrics': None,
+        'patterns': None,
+        'replays': None,
+    }
+
+
+def play_game(game, histogram):
+    """Plays one AI game to the end, returns (won, revealed fraction, moves)"""
+    moves = 0
+
+    while True:
+        start = time.perf_counter()
+
+        revealed_squares, flagged_squares = game.get_AI_input(game.available_info())
+        result = game.apply_moves(revealed_squares, flagged_squares)
+
+        histogram[latency_bucket(time.perf_counter() - start)] += 1
+        moves += 1
+
+        if result.mine_hit or result.won:
+            return result.won, game.get_score(), moves
+
+
+def get_game(difficulty, array_engine):
+    """Returns this process' game for a difficulty, created on first use"""
+    key = (difficulty, array_engine)
+    if key not in GAMES:
+        game_class = engine.ArrayMinesweeper if array_engine else engine.Minesweeper
+        GAMES[key] = game_class(difficulty=DIFFICULTIES[difficulty])
+    return GAMES[key]
+
+
+def run_chunk(task):
+    """Pool worker: plays one game per seed on the given difficulty and returns partial statistics
+
+    With a board pool, game seed plays the pool's board number seed - first_seed instead of a generated one.
+    """
+    difficulty, seeds, array_engine, board_pool, first_seed, instrument, profile, share_patterns, record_replays = task
+    if board_pool:
+        (width, height, _), pool_boards = boards.load_board_pool(board_pool)
+
+    game = get_game(difficulty, array_engine)
+
+    stats = new_stats()
+    replays = []
+    if instrument:
+        metrics.reset()
+        metrics.enable()
+
+    # every worker process adds its chunks to its own pstats file
+    with metrics.profile_session('{}.{}'.format(profile, os.getpid())) if profile else contextlib.nullcontext():
+        for seed in seeds:
+            if board_pool:
+                game.new_game(seed, boards.get_mine_squares(pool_boards[seed - first_seed], width, height))
+            else:
+                game.new_game(seed)
+            won, revealed_fraction, moves = play_game(game, stats['latency_histogram'])
+
+            stats['games'] += 1
+            stats['wins'] += int(won)
+            stats['revealed_fraction'] += revealed_fraction
+            stats['moves'] += moves
+            if record_replays:
+                replays.append(replay.encode_game(game))
+
+    if instrument:
+        metrics.end_game()
+        metrics.disable()
+        stats['metrics'] = metrics.snapshot()
+    if share_patterns:
+        stats['patterns'] = solver.get_pattern_records()
+    if record_replays:
+        stats['replays'] = b''.join(replays)
+    return stats
+
+
+def merge_stats(total, partial):
+    """Adds partial worker statistics into total"""
+    for key in ('games', 'wins', 'revealed_fraction', 'moves'):
+        total[key] += partial[key]
+    for bucket, count in enumerate(partial['latency_histogram']):
+        total['latency_histogram'][bucket] += count
+    if partial['metrics']:
+        if total['metrics'] is None:
+            total['metrics'] = {'counters': {}, 'timings': {}}
+        metrics.merge_snapshot(total['metrics'], partial['metrics'])
+
+
+def run_difficulty(pool, difficulty, games, seed, chunk_size, array_engine, board_pool=None, instrument=False,
+                   profile=None, share_patterns=False, replay_writer=None):
+    """Plays games seeded seed..seed+games-1 on one difficulty, returns its report entry
+
+    With instrument, the entry holds the merged metrics snapshot of every worker (see metrics.py). With
+    share_patterns, the pattern caches of the workers are added to this process' solver.PATTERN_CACHE.
+    Every game is appended to replay_writer if given, in the order the chunks finish.
+    """
+    tasks = [
+        (difficulty, range(start, min(start + chunk_size, seed + games)), array_engine, board_pool, seed,
+         instrument, profile, share_patterns, replay_writer is not None)
+        for start in range(seed, seed + games, chunk_size)
+    ]
+
+    total = new_stats()
+
+    start = time.perf_counter()
+    for partial in pool.imap_unordered(run_chunk, tasks):
+        merge_stats(total, partial)
+        if share_patterns:
+            solver.add_pattern_records(partial['patterns'])
+        if replay_writer:
+            replay_writer.write_records(partial['replays'])
+    elapsed = time.perf_counter() - start
+
+    width, height, mines = DIFFICULTIES[difficulty]
+    return {
+        'difficulty': difficulty,
+        'width': width,
+        'height': height,
+        'mines': mines,
+        'first_seed': seed,
+        'board_pool': board_pool,
+        'games': total['games'],
+        'wins': total['wins'],
+        'win_rate': total['wins'] / total['games'],
+        'average_revealed_fraction': total['revealed_fraction'] / total['games'],
+        'moves': total['moves'],
+        'elapsed_seconds': elapsed,
+        'games_per_second': total['games'] / elapsed,
+        'move_latency_seconds': {
+            'p{}'.format(percentile): latency_percentile(total['latency_histogram'], percentile)
+            for percentile in LATENCY_PERCENTILES
+        },
+        'metrics': total['metrics'],
+    }
+
+
+def run_benchmark(difficulties, games, seed=0, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, array_engine=False,
+                  board_pool=None, instrument=False, profile=None, patterns=None, replays=None):
+    """Runs the benchmark for every difficulty and returns the full report
+
+    A board pool streams pregenerated boards instead of generating them, its size must match the difficulty.
+    profile is the filename prefix of the cProfile statistics written by each worker process. Workers start
+    with the pattern cache saved in patterns, if it exists, and their caches are saved there afterwards. Every
+    game played is appended to the replay file replays (see replay.py).
+    """
+    workers = workers or multiprocessing.cpu_count()
+
+    if board_pool:
+        configuration, pool_boards = boards.load_board_pool(board_pool)
+        if len(pool_boards) < games:
+            raise ValueError('{} holds only {} boards'.format(board_pool, len(pool_boards)))
+        difficulties = [name for name in difficulties if DIFFICULTIES[name] == configuration]
+        if not difficulties:
+            raise ValueError('{} does not match any requested difficulty'.format(board_pool))
+
+    warm_start = patterns and os.path.exists(patterns)
+    if warm_start:
+        solver.load_pattern_cache(patterns)
+
+    replay_writer = replay.ReplayWriter(replays) if replays else None
+    with multiprocessing.Pool(workers, solver.load_pattern_cache if warm_start else None,
+                              (patterns,) if warm_start else ()) as pool:
+        results = [
+            run_difficulty(pool, difficulty, games, seed, chunk_size, array_engine, board_pool, instrument, profile,
+                           patterns is not None, replay_writer)
+            for difficulty in difficulties
+        ]
+    if replay_writer:
+        replay_writer.close()
+
+    if patterns:
+        solver.save_pattern_cache(patterns)
+
+    return {
+        'workers': workers,
+        'array_engine': array_engine,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Minesweeper AI on seeded headless games')
+    parser.add_argument('--games', type=int, default=1000, help='games per difficulty')
+    parser.add_argument('--difficulty', nargs='+', choices=sorted(DIFFICULTIES), default=list(DIFFICULTIES))
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game, games use consecutive seeds')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='games per pool task')
+    parser.add_argument('--array-engine', action='store_true', help='use the NumPy-backed ArrayMinesweeper')
+    parser.add_argument('--boards', default=None, help='board pool file to stream boards from (see boards.py)')
+    parser.add_argument('--output', default=DEFAULT_REPORT_FILENAME, help='JSON report filename')
+    parser.add_argument('--metrics', default=None,
+                        help='also write phase metrics of all difficulties here (.prom for Prometheus text, else JSON)')
+    parser.add_argument('--profile', default=None, help='cProfile each worker into PROFILE.<pid> pstats files')
+    parser.add_argument('--patterns', default=None, help='pattern cache file to warm-start workers from and update')
+    parser.add_argument('--replays', default=None, help='append every game to this replay file (see replay.py)')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.difficulty, args.games, args.seed, args.workers, args.chunk_size, args.array_engine,
+                           args.boards, args.metrics is not None, args.profile, args.patterns, args.replays)
+
+    if args.metrics:
+        snapshot = {'counters': {}, 'timings': {}}
+        for result in report['results']:
+            metrics.merge_snapshot(snapshot, result['metrics'])
+        metrics.write_snapshot(args.metrics, snapshot)
+
+    with open(args.output, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    for result in report['results']:
+        print('{difficulty:>12}: {win_rate:6.1%} won, {average_revealed_fraction:6.1%} revealed, '
+              '{games_per_second:8.1f} games/s'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Pregenerated board pools: seeded mine layouts generated in bulk and stored as packed bitmaps
+
+A pool file is a header followed by one record per board, each record the field's mine bitmap (flat
+x * height + y order) packed eight boxes per byte, so boards can be streamed from a memory map.
+
+    python boards.py expert 100000 --seed 0 --output expert.boards
+"""
+import argparse
+import struct
+
+import numpy as np
+
+import engine
+
+MAGIC = b'MSBP'
+VERSION = 1
+HEADER = struct.Struct('<4sBHHII')  # magic, version, width, height, mines, board count
+GENERATION_CHUNK = 4096  # boards sampled per vectorized batch
+
+
+def get_record_size(width, height):
+    """Returns bytes used by one packed board"""
+    return (width * height + 7) // 8
+
+
+def sample_mine_bitmaps(rng, count, width, height, mines):
+    """Returns a (count, width * height) bool array with mines placed uniformly at random on every row
+
+    The whole batch is drawn at once: the lowest `mines` of a row of random keys are a uniform sample without
+    replacement.
+    """
+    keys = rng.random_sample((count, width * height))
+    mine_squares = np.argpartition(keys, mines - 1, axis=1)[:, :mines]
+
+    bitmaps = np.zeros((count, width * height), dtype=np.bool_)
+    np.put_along_axis(bitmaps, mine_squares, True, axis=1)
+    return bitmaps
+
+
+def generate_boards(width, height, mines, count, seed=0):
+    """Yields arrays of packed mine bitmaps, GENERATION_CHUNK boards at a time"""
+    rng = np.random.RandomState(seed)
+    for start in range(0, count, GENERATION_CHUNK):
+        chunk = min(GENERATION_CHUNK, count - start)
+        yield np.packbits(sample_mine_bitmaps(rng, chunk, width, height, mines), axis=1)
+
+
+def write_board_pool(filename, width, height, mines, count, seed=0):
+    """Generates count boards and writes them to a pool file"""
+    assert mines < width * height, 'More mines than boxes'
+
+    with open(filename, 'wb') as pool_file:
+        pool_file.write(HEADER.pack(MAGIC, VERSION, width, height, mines, count))
+        for boards in generate_boards(width, height, mines, count, seed):
+            pool_file.write(boards.tobytes())
+
+
+def load_board_pool(filename):
+    """Returns ((width, height, mines), boards) with boards a read-only memory map of packed records"""
+    with open(filename, 'rb') as pool_file:
+        magic, version, width, height, mines, count = HEADER.unpack(pool_file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a version {} board pool'.format(filename, VERSION))
+
+    boards = np.memmap(filename, dtype=np.uint8, mode='r', offset=HEADER.size,
+                       shape=(count, get_record_size(width, height)))
+    return (width, height, mines), boards
+
+
+def get_mine_squares(record, width, height):
+    """Returns flat mine indices of one packed board, as accepted by Minesweeper.new_game"""
+    return np.flatnonzero(np.unpackbits(record)[:width * height]).tolist()
+
+
+def iter_board_pool(filename):
+    """Yields the flat mine indices of every board in a pool file"""
+    (width, height, _), boards = load_board_pool(filename)
+    for record in boards:
+        yield get_mine_squares(record, width, height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pregenerate a pool of Minesweeper boards')
+    parser.add_argument('difficulty', choices=sorted(engine.DIFFICULTIES))
+    parser.add_argument('count', type=int, help='boards to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True, help='pool filename')
+    args = parser.parse_args()
+
+    width, height, mines = engine.DIFFICULTIES[args.difficulty]
+    write_board_pool(args.output, width, height, mines, args.count, args.seed)
+
+
+if __name__ == '__main__':
+    main()
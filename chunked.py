@@ -0,0 +1,329 @@
+"""Chunked boards for fields too big to allocate up front, generated one chunk at a time from the game seed
+
+The field is cut into chunk_size x chunk_size chunks. new_game deals the mines to the chunks with one
+multivariate hypergeometric draw, so a board is still uniform with exactly `mines` mines, and each chunk places
+its share from its own RNG the first time a box in it is revealed, flagged or checked for a mine. Reading the
+observation of a chunk nobody touched returns HIDDEN without creating it, so untouched chunks never cost memory.
+Once the created chunks outgrow the memory budget, the least recently used ones are packed: mines and counts are
+dropped since they can be regenerated, the other layers are compressed, which shrinks a settled (fully revealed)
+chunk to a few dozen bytes until it is touched again.
+
+The budget covers the board layers only. Outside it are the neighbour table shared by every board of the size
+(engine.NeighbourTable, about 36 bytes per box) and the per-box Python structures: the changed squares of a turn
+and the solver's dirty sets grow with the boxes a turn reveals (a large flood fill included) and are dropped once
+the solver has read them, its frontier and constraints grow with the frontier, and game.turns keeps every move
+of the game for replays and the turn log.
+
+    python chunked.py 1000 1000 150000 --seed 0 --memory-budget 16
+"""
+import argparse
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import engine
+import metrics
+from engine import MINE_VALUE
+
+CHUNK_SIZE = 64  # boxes per chunk side
+MEMORY_BUDGET = 64 * 1024 * 1024  # bytes of chunk arrays kept unpacked across the layers of a board, nothing else
+
+
+class ChunkCache:
+    """Chunks created by every layer of one board, packed together when the budget is exceeded
+
+    Chunks are packed in the order they were created, except that a chunk read or written since the last pass
+    gets a second chance (the CLOCK approximation of least recently used), which costs one list store per read.
+    """
+
+    def __init__(self, width, height, chunk_size, memory_budget):
+        self.width = width
+        self.chunk_size = chunk_size
+        self.memory_budget = memory_budget
+        self.chunk_counts = (-(-width // chunk_size), -(-height // chunk_size))
+        self.layers = []
+        self.used = [[False] * self.chunk_counts[1] for _ in range(self.chunk_counts[0])]
+        self.resident = OrderedDict()  # chunk key -> bytes of its unpacked layer arrays, oldest first
+        self.resident_bytes = 0
+        self.peak_bytes = 0
+
+    def add(self, key, size):
+        """Accounts for a newly unpacked layer array of a chunk, packing old chunks while over budget"""
+        if key not in self.resident:
+            self.resident[key] = 0
+        self.resident[key] += size
+        self.resident_bytes += size
+        self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+
+        while self.resident_bytes > self.memory_budget and len(self.resident) > 1:
+            oldest, oldest_size = self.resident.popitem(last=False)
+            chunk_x, chunk_y = oldest
+            if self.used[chunk_x][chunk_y] or oldest == key:
+                self.used[chunk_x][chunk_y] = False
+                self.resident[oldest] = oldest_size
+                continue
+
+            for layer in self.layers:
+                layer.pack(oldest)
+            self.resident_bytes -= oldest_size
+            metrics.count('chunks_packed')
+
+    def get_packed_bytes(self):
+        """Returns bytes held by packed chunks"""
+        return sum(len(data) for layer in self.layers for data in layer.packed.values())
+
+
+class ChunkedColumn:
+    """Column x of a ChunkedLayer, so that layer[x][y] reads and writes single boxes like a nested list"""
+
+    def __init__(self, layer, x):
+        self.layer = layer
+        self.default = layer.default
+        self.chunk_size = layer.cache.chunk_size
+        self.chunk_x, self.x = divmod(x, self.chunk_size)
+        self.chunks = layer.grid[self.chunk_x]
+        self.used = layer.cache.used[self.chunk_x]
+
+    def __getitem__(self, y):
+        chunk_y, y = divmod(y, self.chunk_size)
+        chunk = self.chunks[chunk_y]
+        if chunk is None:
+            chunk = self.layer.load_chunk(self.chunk_x, chunk_y, False)
+            if chunk is None:
+                return self.default
+        self.used[chunk_y] = True
+        return chunk[self.x, y]
+
+    def __setitem__(self, y, value):
+        chunk_y, y = divmod(y, self.chunk_size)
+        chunk = self.chunks[chunk_y]
+        if chunk is None:
+            chunk = self.layer.load_chunk(self.chunk_x, chunk_y, True)
+        self.used[chunk_y] = True
+        chunk[self.x, y] = value
+
+
+class ChunkedLayer:
+    """One per-box layer of a chunked board (mines, revealed, flags or observation), indexed as layer[x][y]
+
+    A layer with a generator creates chunks on the first read and drops them when packed, the others create a
+    chunk on its first write and compress it when packed. Boxes of chunks that do not exist read as default.
+    """
+
+    def __init__(self, cache, default, generator=None):
+        self.cache = cache
+        self.default = default
+        self.dtype = np.bool_ if isinstance(default, bool) else np.int8
+        self.generator = generator  # chunk key -> (chunk_size, chunk_size) array
+        self.grid = [[None] * cache.chunk_counts[1] for _ in range(cache.chunk_counts[0])]  # unpacked arrays
+        self.packed = {}  # chunk key -> compressed array
+        self.columns = [ChunkedColumn(self, x) for x in range(cache.width)]
+        cache.layers.append(self)
+
+    def __getitem__(self, x):
+        return self.columns[x]
+
+    def __len__(self):
+        return len(self.columns)
+
+    def load_chunk(self, chunk_x, chunk_y, create):
+        """Unpacks or creates a chunk that is not in memory, returns None if it does not exist and create is not set
+
+        A layer with a generator always creates the chunk.
+        """
+        key = (chunk_x, chunk_y)
+        data = self.packed.pop(key, None)
+        if data is not None:
+            chunk = self.unpack(data)
+        elif self.generator:
+            chunk = self.generator(key)
+        elif create:
+            chunk = np.full((self.cache.chunk_size, self.cache.chunk_size), self.default, dtype=self.dtype)
+        else:
+            return None
+
+        self.grid[chunk_x][chunk_y] = chunk
+        self.cache.add(key, chunk.nbytes)
+        return chunk
+
+    def get_chunk(self, chunk_x, chunk_y):
+        """Returns the array of a chunk, None if it was never created"""
+        chunk = self.grid[chunk_x][chunk_y]
+        if chunk is None:
+            chunk = self.load_chunk(chunk_x, chunk_y, False)
+        return chunk
+
+    def get_keys(self):
+        """Returns the keys of every chunk this layer created, packed or not"""
+        keys = [(chunk_x, chunk_y) for chunk_x, column in enumerate(self.grid)
+                for chunk_y, chunk in enumerate(column) if chunk is not None]
+        return keys + list(self.packed)
+
+    def pack(self, key):
+        """Drops a chunk from memory, keeping it compressed unless the generator can rebuild it"""
+        chunk_x, chunk_y = key
+        chunk = self.grid[chunk_x][chunk_y]
+        if chunk is None:
+            return
+        self.grid[chunk_x][chunk_y] = None
+        if not self.generator:
+            if self.dtype == np.bool_:
+                chunk = np.packbits(chunk)
+            self.packed[key] = zlib.compress(chunk.tobytes())
+
+    def unpack(self, data):
+        """Returns the array of a compressed chunk"""
+        chunk_size = self.cache.chunk_size
+        data = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+        if self.dtype == np.bool_:
+            data = np.unpackbits(data)[:chunk_size * chunk_size].astype(np.bool_)
+        return data.view(self.dtype).reshape(chunk_size, chunk_size).copy()
+
+
+class ChunkedMinesweeper(engine.Minesweeper):
+    """Minesweeper whose board layers are chunked and generated on demand, for fields of millions of boxes
+
+    mine_field uses the ArrayMinesweeper encoding (counts, MINE_VALUE for mines). Boards come from the game seed
+    alone: FIRST_CLICK rules and pregenerated mine squares do not apply.
+    """
+
+    def __init__(self, ai_mode=None, predictor=None, difficulty=None, chunk_size=CHUNK_SIZE,
+                 memory_budget=MEMORY_BUDGET):
+        self.chunk_size = chunk_size
+        self.memory_budget = memory_budget
+        super().__init__(ai_mode, predictor, difficulty)
+
+    def new_game(self, seed=None, mine_squares=None):
+        """Starts a game on a fresh chunked board, nothing is generated until the first move"""
+        if mine_squares is not None:
+            raise ValueError('Chunked boards are generated from the game seed, not from mine squares')
+        self.first_click = None  # the first reveal cannot move mines that are fixed by the seed
+        self.chunk_cache = ChunkCache(self.width, self.height, self.chunk_size, self.memory_budget)
+        return super().new_game(seed)
+
+    def show_mines(self):
+        """Reveals the mines of every chunk with revealed boxes, the rest of the board stays untouched"""
+        for chunk_x, chunk_y in self.revealed_boxes.get_keys():
+            mines = np.argwhere(self.mine_field.get_chunk(chunk_x, chunk_y) == MINE_VALUE)
+            for i, j in mines.tolist():
+                x, y = chunk_x * self.chunk_size + i, chunk_y * self.chunk_size + j
+                if not self.revealed_boxes[x][y]:
+                    self.revealed_boxes[x][y] = True
+                    self.update_observation(x, y)
+                    if self.journal is not None:
+                        self.journal.append((x, y, False))
+
+    def is_there_mine(self, field, x, y):
+        """Checks if mine is located at specific box on field"""
+        return field[x][y] == MINE_VALUE
+
+    def get_random_minefield(self, safe_square=None):
+        """Returns the mine layer, after dealing each chunk its number of mines"""
+        chunk_size = self.chunk_size
+        widths = np.minimum(chunk_size, self.width - np.arange(0, self.width, chunk_size))
+        heights = np.minimum(chunk_size, self.height - np.arange(0, self.height, chunk_size))
+        areas = np.outer(widths, heights)
+        rng = np.random.default_rng(self.seed)
+        self.chunk_mines = rng.multivariate_hypergeometric(areas.ravel(), self.mines).reshape(areas.shape)
+        self.chunk_widths, self.chunk_heights = widths.tolist(), heights.tolist()
+        return ChunkedLayer(self.chunk_cache, 0, self.generate_chunk)
+
+    def get_minefield(self, mine_squares):
+        raise ValueError('Chunked boards are generated from the game seed, not from mine squares')
+
+    def get_field_with_value(self, value):
+        """Returns a chunked layer that reads as VALUE everywhere until written"""
+        return ChunkedLayer(self.chunk_cache, value)
+
+    def get_mine_bitmap(self):
+        """Returns the mine layout as a flat x * height + y bool array, drawn chunk by chunk without creating chunks"""
+        chunk_size = self.chunk_size
+        mines = np.zeros((self.width, self.height), dtype=np.bool_)
+        for chunk_x, width in enumerate(self.chunk_widths):
+            for chunk_y, height in enumerate(self.chunk_heights):
+                x, y = chunk_x * chunk_size, chunk_y * chunk_size
+                mines[x:x + width, y:y + height] = self.get_chunk_mines(chunk_x, chunk_y)[:width, :height]
+        return mines.ravel()
+
+    def get_info_snapshot(self):
+        """Returns available_info as an int8 array, copied chunk by chunk without creating chunks"""
+        chunk_size = self.chunk_size
+        info = np.full((self.width, self.height), engine.HIDDEN, dtype=np.int8)
+        for chunk_x, width in enumerate(self.chunk_widths):
+            for chunk_y, height in enumerate(self.chunk_heights):
+                chunk = self.observation.get_chunk(chunk_x, chunk_y)
+                if chunk is not None:
+                    x, y = chunk_x * chunk_size, chunk_y * chunk_size
+                    info[x:x + width, y:y + height] = chunk[:width, :height]
+        return info
+
+    def get_chunk_mines(self, chunk_x, chunk_y):
+        """Returns the mine bitmap of a chunk, drawn from its own RNG, all False outside the field"""
+        chunk_size = self.chunk_size
+        mines = np.zeros((chunk_size, chunk_size), dtype=np.bool_)
+        chunk_count_x, chunk_count_y = self.chunk_mines.shape
+        if 0 <= chunk_x < chunk_count_x and 0 <= chunk_y < chunk_count_y:
+            width, height = self.chunk_widths[chunk_x], self.chunk_heights[chunk_y]
+            rng = np.random.default_rng([self.seed, chunk_x, chunk_y])
+            squares = rng.choice(width * height, self.chunk_mines[chunk_x, chunk_y], replace=False)
+            mines[squares // height, squares % height] = True
+        return mines
+
+    @metrics.timed('generate_chunk')
+    def generate_chunk(self, key):
+        """Returns the counts of a chunk with MINE_VALUE for mines, reading the mines of the 8 chunks around it"""
+        chunk_x, chunk_y = key
+        chunk_size = self.chunk_size
+        area = np.block([
+            [self.get_chunk_mines(chunk_x + i, chunk_y + j) for j in (-1, 0, 1)]
+            for i in (-1, 0, 1)
+        ])
+        padded = area[chunk_size - 1:2 * chunk_size + 1, chunk_size - 1:2 * chunk_size + 1].astype(np.int8)
+        mines = padded[1:-1, 1:-1].astype(np.bool_)
+
+        field = np.zeros((chunk_size, chunk_size), dtype=np.int8)
+        for i in range(3):
+            for j in range(3):
+                if i != 1 or j != 1:
+                    field += padded[i:i + chunk_size, j:j + chunk_size]
+        field[mines] = MINE_VALUE
+        metrics.count('chunks_generated')
+        return field
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play one AI game on a huge chunked board')
+    parser.add_argument('width', type=int)
+    parser.add_argument('height', type=int)
+    parser.add_argument('mines', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ai-mode', default='constraint', help='see engine.AI_MODE')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--memory-budget', type=float, default=MEMORY_BUDGET / 2 ** 20,
+                        help='in MiB, for the board layers only')
+    args = parser.parse_args()
+
+    game = ChunkedMinesweeper(args.ai_mode, difficulty=(args.width, args.height, args.mines),
+                              chunk_size=args.chunk_size, memory_budget=int(args.memory_budget * 2 ** 20))
+    game.new_game(args.seed)
+
+    start = time.perf_counter()
+    turns = 0
+    while not game.mine_hit and not game.is_game_won():
+        game.apply_moves(*game.get_AI_input(game.available_info()))
+        turns += 1
+    elapsed = time.perf_counter() - start
+
+    cache = game.chunk_cache
+    chunk_count = game.chunk_mines.size
+    touched = len(set(game.revealed_boxes.get_keys()) | set(game.flagged_mines.get_keys()))
+    print('{} after {} turns, {:.1%} revealed, {:.1f} s'.format(
+        'won' if game.is_game_won() else 'lost', turns, game.get_score(), elapsed))
+    print('{} of {} chunks touched, {} unpacked, peak {:.1f} MiB unpacked, {:.1f} KiB packed'.format(
+        touched, chunk_count, len(cache.resident), cache.peak_bytes / 2 ** 20, cache.get_packed_bytes() / 2 ** 10))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""Streaming reader for binary turn logs (see turnlog.py)
+
+Shards are memory-mapped and consumed block by block, so memory use depends on the block and shuffle buffer
+sizes, never on the size of the data set.
+"""
+import glob
+
+import numpy as np
+
+import turnlog
+
+BLOCK_RECORDS = 65536  # records read from a shard at a time
+MAX_SEEN_TURNS = 10000000  # canonical keys remembered for deduplication before the memory is reset
+
+
+def get_shard_filenames(patterns):
+    """Expands filenames and glob patterns into a sorted list of shard filenames"""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return sorted({filename for pattern in patterns for filename in glob.glob(pattern)})
+
+
+def iter_blocks(filenames, skip_lost=True, mines=False):
+    """Yields (boards, moves, scores) blocks of every shard in order, skipping turns that hit a mine
+
+    With mines, blocks also hold the (turns, width, height) 0/1 mine layouts, which only version 2 logs record.
+    """
+    shape = None
+    for filename in filenames:
+        records = turnlog.read_turn_log(filename)
+        if shape is None:
+            shape = records.dtype['board'].shape
+        elif records.dtype['board'].shape != shape:
+            raise ValueError('{} holds turns of another field size, pass the shards of one size'.format(filename))
+        if mines and 'mines' not in records.dtype.names:
+            raise ValueError('{} is a version 1 turn log without mine layouts'.format(filename))
+
+        for start in range(0, len(records), BLOCK_RECORDS):
+            block = records[start:start + BLOCK_RECORDS]
+            if skip_lost:
+                block = block[block['score'] > 0]
+            if mines:
+                yield block['board'], block['move'], block['score'], turnlog.get_mine_layers(block)
+            else:
+                yield block['board'], block['move'], block['score']
+
+
+def transform(boards, moves, symmetries):
+    """Applies one of the 8 dihedral symmetries per row: bit 0 transposes, bit 1 flips x, bit 2 flips y
+
+    boards are (batch, width, height) and moves (batch, 2); transposing requires square boards.
+    """
+    boards = boards.copy()
+    moves = moves.copy()
+    width, height = boards.shape[1:]
+
+    rows = symmetries & 1 == 1
+    if rows.any():
+        boards[rows] = boards[rows].transpose(0, 2, 1)
+        moves[rows] = moves[rows][:, ::-1]
+
+    rows = symmetries & 2 == 2
+    boards[rows] = boards[rows, ::-1, :]
+    moves[rows, 0] = width - 1 - moves[rows, 0]
+
+    rows = symmetries & 4 == 4
+    boards[rows] = boards[rows, :, ::-1]
+    moves[rows, 1] = height - 1 - moves[rows, 1]
+
+    return boards, moves
+
+
+def get_symmetry_count(boards):
+    """Returns how many symmetries keep the board shape: 8 for square boards, else only the 4 flips"""
+    width, height = boards.shape[1:]
+    return 8 if width == height else 4
+
+
+def get_random_symmetries(boards, rng):
+    """Returns a random symmetry per turn, among those that keep the board shape"""
+    count = get_symmetry_count(boards)
+    return rng.randint(count, size=len(boards)) * (8 // count)  # even symmetries never transpose
+
+
+def augment(boards, moves, rng):
+    """Returns copies of a batch with a random board symmetry applied to each turn"""
+    return transform(boards, moves, get_random_symmetries(boards, rng))
+
+
+def get_canonical_keys(boards, moves):
+    """Returns one 64-bit key per turn that is the same for all symmetric copies of its board and move
+
+    Each symmetric copy is hashed with fixed random weights, the smallest hash is the canonical key.
+    """
+    width, height = boards.shape[1:]
+    weights = np.random.RandomState(0).randint(1, 2 ** 62, size=width * height + 2, dtype=np.int64)
+    weights = weights.astype(np.uint64)
+
+    keys = None
+    for symmetry in range(0, 8, 8 // get_symmetry_count(boards)):
+        symmetric_boards, symmetric_moves = transform(boards, moves, np.full(len(boards), symmetry))
+        values = np.concatenate([
+            symmetric_boards.reshape(len(boards), -1).astype(np.int64) + 3,
+            symmetric_moves.astype(np.int64) + 1,
+        ], axis=1).astype(np.uint64)
+        hashes = (values * weights).sum(axis=1, dtype=np.uint64)
+        keys = hashes if keys is None else np.minimum(keys, hashes)
+    return keys
+
+
+def deduplicate(blocks, max_seen=MAX_SEEN_TURNS):
+    """Yields blocks without turns whose canonical key has been seen before
+
+    Seen keys are kept sorted in one preallocated uint64 array, 8 bytes per key. Only max_seen keys are
+    remembered, past that the memory starts over so it stays bounded.
+    """
+    seen = np.empty(max_seen, dtype=np.uint64)
+    count = 0
+    for block in blocks:
+        keys, first = np.unique(get_canonical_keys(*block[:2]), return_index=True)
+        positions = np.searchsorted(seen[:count], keys)
+        inside = positions < count
+        found = np.zeros(len(keys), dtype=np.bool_)
+        found[inside] = seen[positions[inside]] == keys[inside]
+        keys, first = keys[~found], first[~found]
+
+        if count + len(keys) > max_seen:
+            count = 0
+        keys = keys[:max_seen]
+        seen[count:count + len(keys)] = keys
+        count += len(keys)
+        seen[:count].sort(kind='stable')  # two sorted runs, merged in linear time
+
+        keep = np.zeros(len(block[0]), dtype=np.bool_)
+        keep[first] = True
+        yield tuple(column[keep] for column in block)
+
+
+def iter_batches(patterns, batch_size, shuffle_buffer=0, seed=None, epochs=1, skip_lost=True,
+                 augment_symmetries=False, deduplicate_turns=False, mines=False):
+    """Yields fixed-shape (boards, moves, scores) batches from turn log shards
+
+    With shuffle_buffer, shard order is shuffled every epoch and turns are shuffled within a window of about
+    shuffle_buffer turns. Turns that do not fill a last batch are dropped so every batch has batch_size rows.
+    augment_symmetries applies a random rotation/reflection to every turn as its batch is produced, and
+    deduplicate_turns drops turns that are symmetric copies of one already read. With mines, batches also hold
+    the turns' mine layouts, see iter_blocks.
+    """
+    filenames = get_shard_filenames(patterns)
+    if not filenames:
+        raise ValueError('No turn logs match {}'.format(patterns))
+
+    rng = np.random.RandomState(seed)
+    epoch = 0
+    while epochs is None or epoch < epochs:
+        epoch += 1
+        if shuffle_buffer:
+            filenames = [filenames[i] for i in rng.permutation(len(filenames))]
+
+        blocks = iter_blocks(filenames, skip_lost, mines)
+        if deduplicate_turns:
+            blocks = deduplicate(blocks)
+
+        pending = None
+        for block in blocks:
+            pending = block if pending is None else tuple(np.concatenate(pair) for pair in zip(pending, block))
+            if len(pending[0]) < max(shuffle_buffer, batch_size):
+                continue
+
+            if shuffle_buffer:
+                order = rng.permutation(len(pending[0]))
+                pending = tuple(column[order] for column in pending)
+
+            # keep half of the shuffle window back so it mixes with the next block
+            ready = len(pending[0]) - shuffle_buffer // 2
+            ready -= ready % batch_size
+            for start in range(0, ready, batch_size):
+                yield get_batch(pending, start, batch_size, rng if augment_symmetries else None)
+            pending = tuple(column[ready:] for column in pending)
+
+        if pending is not None and len(pending[0]) >= batch_size:
+            if shuffle_buffer:
+                order = rng.permutation(len(pending[0]))
+                pending = tuple(column[order] for column in pending)
+            for start in range(0, len(pending[0]) - batch_size + 1, batch_size):
+                yield get_batch(pending, start, batch_size, rng if augment_symmetries else None)
+
+
+def get_batch(columns, start, batch_size, augment_rng=None):
+    """Returns one contiguous batch of (boards, moves, scores[, mines]), augmented if given an RNG"""
+    batch = [np.ascontiguousarray(column[start:start + batch_size]) for column in columns]
+    if augment_rng:
+        symmetries = get_random_symmetries(batch[0], augment_rng)
+        if len(batch) > 3:
+            batch[3], _ = transform(batch[3], batch[1], symmetries)  # mine layouts turn with their boards
+        batch[0], batch[1] = transform(batch[0], batch[1], symmetries)
+    return tuple(batch)
+
+
+def get_field_size(patterns):
+    """Returns (width, height) of the turns in the first matching shard"""
+    filenames = get_shard_filenames(patterns)
+    if not filenames:
+        raise ValueError('No turn logs match {}'.format(patterns))
+    return turnlog.read_turn_log(filenames[0]).dtype['board'].shape
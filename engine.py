@@ -0,0 +1,661 @@
+"""Headless Minesweeper engine: board state, moves and counters, with no UI or machine learning imports
+
+minesweeper.py adds the pygame window on top of these classes, solver.py holds the AIs behind get_AI_input.
+"""
+import contextlib
+import functools
+import random
+from collections import deque, namedtuple
+
+import numpy as np
+
+import metrics
+import turnlog
+
+# AI
+# 'simple': full-board count rule every turn, 'frontier': incremental count rule,
+# 'constraint': frontier count rule plus subset reduction between overlapping numbers,
+# 'probability': constraint rules, guessing the square with the lowest exact mine probability,
+# 'neural': constraint rules, guessing with mine probabilities predicted by a network (see neural_service.py)
+AI_MODE = 'probability'
+
+# ENGINE
+# None: mines are placed by new_game, 'safe': placed on the first reveal so it is never a mine,
+# 'zero': placed on the first reveal so it is a 0 (falls back to 'safe' if the field is too crowded)
+FIRST_CLICK = None
+
+# DIFFICULTY
+TEST = (4, 4, 2)
+BEGINNER = (8, 8, 10)
+INTERMEDIATE = (16, 16, 40)
+EXPERT = (24, 24, 99)
+DIFFICULTIES = {
+    'test': TEST,
+    'beginner': BEGINNER,
+    'intermediate': INTERMEDIATE,
+    'expert': EXPERT,
+}
+
+DIFFICULTY = TEST  # (width, height, mines) of games created without a difficulty of their own
+
+# NEIGHBOURS
+NEIGHBOUR_TABLE_CACHE_SIZE = 8  # neighbour tables kept, one per field size
+NEIGHBOUR_DECODE_CACHE_SIZE = 4096  # (x, y) neighbour tuples kept per table, the frontier is looked up every turn
+
+# PERSISTENT DATA
+LOG_TO_FILE = False
+LOG_FORMAT = 'binary'  # 'binary': fixed-size records (see turnlog.py), 'json': one JSON object per line
+DATABASE_FILENAME = 'data.txt'
+TURN_LOG_FILENAME = 'data.{width}x{height}.turns'  # one binary log per field size, each log holds a single size
+
+# assertions
+assert DIFFICULTY[2] < DIFFICULTY[0] * DIFFICULTY[1], 'More mines than boxes'
+
+# result of Minesweeper.apply_moves: newly revealed boxes, reveals actually applied, and the game state after them
+MoveResult = namedtuple('MoveResult', ['revealed', 'moves', 'mine_hit', 'won'])
+# result of Minesweeper.checkpoint: journal length and the game state that rollback restores
+Checkpoint = namedtuple('Checkpoint', ['journal_length', 'mine_field', 'mines_placed', 'revealed_count', 'flag_count',
+                                       'mine_hit', 'changed_squares', 'changed_count', 'turn_count', 'rng_state'])
+
+MINE = 'X'
+MINE_VALUE = 9  # int8 code for a mine in available_info and on array-backed boards
+FLAGGED = -2
+HIDDEN = -1
+
+
+class Minesweeper:
+    def __init__(self, ai_mode=None, predictor=None, difficulty=None):
+        # random.seed(0)  # Seed the RNG for DEBUG purposes
+        from solver import SOLVERS  # solver imports the board constants of this module
+
+        self.ai_mode = ai_mode or AI_MODE
+        # field size and mine count of this game, e.g. EXPERT or a custom (500, 500, 50000)
+        self.width, self.height, self.mines = difficulty or DIFFICULTY
+        assert self.mines < self.width * self.height, 'More mines than boxes'
+        self.neighbours = self.load_neighbour_table()
+        self.predictor = predictor  # anything with predict(board) -> mine probabilities, used by NeuralSolver
+        self.first_click = FIRST_CLICK
+
+        if not LOG_TO_FILE:
+            self.database = None
+        elif LOG_FORMAT == 'binary':
+            filename = TURN_LOG_FILENAME.format(width=self.width, height=self.height)
+            self.database = turnlog.BinaryTurnLog(filename, self.width, self.height)
+        else:
+            self.database = turnlog.JsonTurnLog(DATABASE_FILENAME)
+
+        self.solver = SOLVERS[self.ai_mode](self) if self.ai_mode in SOLVERS else None
+        self.mine_field, self.revealed_boxes, self.flagged_mines = self.new_game()
+
+    def new_game(self, seed=None, mine_squares=None):
+        """Set up mine field data structure, revealed box and flagged box boolean data structures and counters
+
+        Every game draws from its own RNG seeded with seed (a fresh one from the random module if None), so a game
+        is reproducible from its seed. mine_squares places a pregenerated board (flat x * height + y indices).
+        """
+        metrics.end_game()
+
+        # turns are written in one batch per game
+        if self.database:
+            with metrics.timer('log.flush'):
+                self.database.flush()
+
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+
+        self.mine_squares = mine_squares  # pregenerated board, if any, kept for replays
+        self.mines_placed = mine_squares is not None or self.first_click is None
+        if mine_squares is not None:
+            self.mine_field = self.get_minefield(mine_squares)
+        elif self.mines_placed:
+            self.mine_field = self.get_random_minefield()
+        else:
+            self.mine_field = self.get_field_with_value(0)
+        self.revealed_boxes = self.get_field_with_value(False)
+        self.flagged_mines = self.get_field_with_value(False)
+        self.observation = self.get_field_with_value(HIDDEN)  # what available_info shows, updated in place
+
+        # running counters, kept up to date by reveal_square and toggle_flag_box
+        self.revealed_count = 0  # revealed boxes that are not mines
+        self.flag_count = 0
+        self.mine_hit = False
+
+        # boxes revealed or (un)flagged since the AI last looked at the board
+        self.changed_squares = []
+        # (reveals, flags) of every apply_moves call, enough to replay the game from its seed (see replay.py)
+        self.turns = []
+        # (x, y, flag) of every box revealed (flag False) or (un)flagged since the oldest checkpoint, None if none
+        self.journal = None
+        self.open_checkpoints = 0
+        # mine_field whose layout packed_mines holds, see get_packed_mines
+        self.packed_mine_field = None
+        if self.solver:
+            self.solver.reset()
+
+        return self.mine_field, self.revealed_boxes, self.flagged_mines
+
+    def is_game_won(self):
+        """Checks if player has revealed all boxes without hitting a mine"""
+        return not self.mine_hit and self.revealed_count >= (self.width * self.height) - self.mines
+
+    def is_game_lost(self):
+        """Checks if player has revealed a mine"""
+        return self.mine_hit
+
+    def mines_remaining(self):
+        """Returns how many mines are left to flag"""
+        return self.mines - self.flag_count
+
+    def get_score(self):
+        """Returns fraction of the non-mine boxes that have been revealed"""
+        return float(self.revealed_count) / float((self.height * self.width) - self.mines)
+
+    @metrics.timed('log.append')
+    def save_turn(self, selected_square, board=None):
+        """Logs a move with the board it was chosen on, from get_info_snapshot taken before the move was applied"""
+        info = self.get_info_snapshot() if board is None else board
+
+        if self.is_there_mine(self.mine_field, selected_square[0], selected_square[1]):
+            score = 0
+        else:
+            score = self.get_score()
+
+        self.database.append(info, selected_square, score, self.get_packed_mines())
+
+    @metrics.timed('available_info')
+    def available_info(self):
+        """Returns counts for revealed boxes, HIDDEN, FLAGGED, and MINE_VALUE for revealed mines
+
+        This is the game's own observation buffer, kept up to date box by box: read it, never modify it.
+        """
+        # self.debug_field(self.observation, 'info')
+        return self.observation
+
+    def get_info_snapshot(self):
+        """Returns an int8 copy of available_info that applying later moves leaves untouched"""
+        return np.array(self.available_info(), dtype=np.int8)
+
+    def update_observation(self, x, y):
+        """Refreshes the available_info value of a single box"""
+        if self.flagged_mines[x][y]:
+            self.observation[x][y] = FLAGGED
+        elif not self.revealed_boxes[x][y]:
+            self.observation[x][y] = HIDDEN
+        elif self.is_there_mine(self.mine_field, x, y):
+            self.observation[x][y] = MINE_VALUE
+        else:
+            self.observation[x][y] = self.mine_field[x][y]
+
+    def toggle_flag_box(self, x, y):
+        """Toggles if mine box is flagged"""
+        if not self.flagged_mines[x][y] and not self.revealed_boxes[x][y]:
+            self.flagged_mines[x][y] = True
+            self.flag_count += 1
+        elif self.flagged_mines[x][y]:
+            self.flagged_mines[x][y] = False
+            self.flag_count -= 1
+        else:
+            return
+
+        self.changed_squares.append((x, y))
+        self.update_observation(x, y)
+        if self.journal is not None:
+            self.journal.append((x, y, True))
+
+    def reveal_square(self, x, y):
+        """Marks a single box as revealed and updates counters, returns False if it was already revealed"""
+        if self.revealed_boxes[x][y]:
+            return False
+
+        self.revealed_boxes[x][y] = True
+        self.changed_squares.append((x, y))
+        self.update_observation(x, y)
+        if self.journal is not None:
+            self.journal.append((x, y, False))
+        if self.is_there_mine(self.mine_field, x, y):
+            self.mine_hit = True
+        else:
+            self.revealed_count += 1
+        return True
+
+    @metrics.timed('apply_moves')
+    def apply_moves(self, reveals=(), flags=()):
+        """Applies a whole turn: toggles flags first, then reveals boxes with a single combined flood fill
+
+        Repeated squares and boxes that are already revealed are skipped, and reveals stop at the first mine.
+        Returns a MoveResult.
+        """
+        reveals = [tuple(square) for square in reveals]
+        flags = [tuple(square) for square in flags]
+        self.turns.append((reveals, flags))
+
+        for x, y in dict.fromkeys(flags):
+            self.toggle_flag_box(x, y)
+
+        newly_revealed = set()
+        moves = []
+        zero_squares = []
+        for x, y in dict.fromkeys(reveals):
+            if self.revealed_boxes[x][y]:
+                continue
+            if not self.mines_placed:
+                self.mine_field = self.get_random_minefield((x, y))
+                self.mines_placed = True
+
+            self.reveal_square(x, y)
+            newly_revealed.add((x, y))
+            moves.append((x, y))
+            if self.is_there_mine(self.mine_field, x, y):
+                self.show_mines()
+                break
+            if self.mine_field[x][y] == 0:
+                zero_squares.append((x, y))
+
+        newly_revealed |= self.flood_fill(zero_squares)
+        metrics.count('reveals', len(moves))
+        metrics.count('boxes_revealed', len(newly_revealed))
+        return MoveResult(newly_revealed, moves, self.mine_hit, self.is_game_won())
+
+    @metrics.timed('reveal_box')
+    def reveal_box(self, x, y):
+        """Reveals box clicked"""
+        if not self.mines_placed:
+            self.mine_field = self.get_random_minefield((x, y))
+            self.mines_placed = True
+
+        has_game_ended = False
+        self.reveal_square(x, y)
+
+        # when 0 is revealed, show relevant boxes
+        if self.mine_field[x][y] == 0:
+            self.reveal_empty_squares(x, y)
+
+        # when mine is revealed, show mines
+        if self.is_there_mine(self.mine_field, x, y):
+            self.show_mines()
+            has_game_ended = True
+
+        if self.is_game_won():
+            has_game_ended = True
+
+        return has_game_ended
+
+    def reveal_empty_squares(self, box_x, box_y):
+        """Modifies revealed_boxes data structure if chosen box_x & box_y is 0
+        Shows all connected boxes with an iterative flood fill, returns the set of newly revealed boxes
+        """
+        newly_revealed = set()
+        if self.reveal_square(box_x, box_y):
+            newly_revealed.add((box_x, box_y))
+
+        newly_revealed |= self.flood_fill([(box_x, box_y)])
+        return newly_revealed
+
+    @metrics.timed('flood_fill')
+    def flood_fill(self, zero_squares):
+        """Reveals every box connected to the given revealed 0 boxes, returns the set of newly revealed boxes"""
+        newly_revealed = set()
+
+        # revealed_boxes doubles as the visited bitmap: every box is queued at most once
+        queue = deque(zero_squares)
+        while queue:
+            x, y = queue.popleft()
+            for i, j in self.neighbours.get_squares(x, y):
+                if self.reveal_square(i, j):
+                    newly_revealed.add((i, j))
+                    if self.mine_field[i][j] == 0:
+                        queue.append((i, j))
+
+        return newly_revealed
+
+    def show_mines(self):
+        """Modifies revealed_boxes data structure if chosen box_x & box_y is X"""
+        for i in range(self.width):
+            for j in range(self.height):
+                if self.is_there_mine(self.mine_field, i, j) and not self.revealed_boxes[i][j]:
+                    self.revealed_boxes[i][j] = True
+                    self.update_observation(i, j)
+                    if self.journal is not None:
+                        self.journal.append((i, j, False))
+
+    def checkpoint(self):
+        """Starts journaling box changes if needed and returns a Checkpoint to roll back to
+
+        Checkpoints nest. Journaling costs one list append per changed box until every checkpoint is released.
+        """
+        if self.journal is None:
+            self.journal = []
+        self.open_checkpoints += 1
+        return Checkpoint(len(self.journal), self.mine_field, self.mines_placed, self.revealed_count, self.flag_count,
+                          self.mine_hit, self.changed_squares, len(self.changed_squares), len(self.turns),
+                          self.rng.getstate())
+
+    def rollback(self, checkpoint):
+        """Restores the game to a checkpoint, undoing only the boxes changed since
+
+        Solver state is not journaled: roll back before the solver sees the changes, as hypothetical does.
+        """
+        self.mine_field = checkpoint.mine_field
+        self.mines_placed = checkpoint.mines_placed
+        self.revealed_count = checkpoint.revealed_count
+        self.flag_count = checkpoint.flag_count
+        self.mine_hit = checkpoint.mine_hit
+        self.changed_squares = checkpoint.changed_squares
+        del self.changed_squares[checkpoint.changed_count:]
+        del self.turns[checkpoint.turn_count:]
+        # a first reveal or a solver guess in between draws from the RNG, replays need it as it was
+        self.rng.setstate(checkpoint.rng_state)
+
+        journal = self.journal
+        while len(journal) > checkpoint.journal_length:
+            x, y, flag = journal.pop()
+            if flag:
+                self.flagged_mines[x][y] = not self.flagged_mines[x][y]
+            else:
+                self.revealed_boxes[x][y] = False
+            self.update_observation(x, y)
+
+    def release(self, checkpoint):
+        """Keeps the changes made since a checkpoint, journaling stops once every checkpoint is released"""
+        self.open_checkpoints -= 1
+        if not self.open_checkpoints:
+            self.journal = None
+
+    @contextlib.contextmanager
+    def hypothetical(self, mine_field=None):
+        """Runs the block on the current game and rolls every change back on exit
+
+        With mine_field, e.g. from get_minefield(mine_squares), moves in the block are played against that layout
+        instead of the real one. It should agree with the boxes already revealed.
+
+            with game.hypothetical(game.get_minefield(sampled_mines)):
+                result = game.apply_moves([(x, y)])
+        """
+        checkpoint = self.checkpoint()
+        if mine_field is not None:
+            self.mine_field = mine_field
+            self.mines_placed = True
+        try:
+            yield self
+        finally:
+            self.rollback(checkpoint)
+            self.release(checkpoint)
+
+    def is_there_mine(self, field, x, y):
+        """Checks if mine is located at specific box on field"""
+        return field[x][y] == MINE
+
+    def get_mine_bitmap(self):
+        """Returns the mine layout as a flat x * height + y bool array"""
+        return np.array([self.is_there_mine(self.mine_field, x, y)
+                         for x in range(self.width) for y in range(self.height)], dtype=np.bool_)
+
+    def get_packed_mines(self):
+        """Returns the mine layout packed eight boxes per byte, computed once per board for the turn log
+
+        A board placed on the first reveal or swapped in by hypothetical is a new mine_field, so it is packed anew.
+        """
+        if self.packed_mine_field is not self.mine_field:
+            self.packed_mines = np.packbits(self.get_mine_bitmap())
+            self.packed_mine_field = self.mine_field
+        return self.packed_mines
+
+    def place_numbers(self, field):
+        """Places numbers in width x height data structure"""
+        for x in range(self.width):
+            for y in range(self.height):
+                if not self.is_there_mine(field, x, y):
+                    field[x][y] = [
+                        field[neighbour_x][neighbour_y]
+                        for neighbour_x, neighbour_y in self.neighbours.get_squares(x, y)
+                    ].count(MINE)
+
+    @metrics.timed('generate_board')
+    def get_random_minefield(self, safe_square=None):
+        """Places mines in width x height data structure, keeping first_click rules around safe_square"""
+        mine_squares = get_mine_squares(self.width, self.height, self.mines, self.rng, safe_square,
+                                        self.first_click == 'zero')
+        return self.get_minefield(mine_squares)
+
+    @metrics.timed('place_board')
+    def get_minefield(self, mine_squares):
+        """Returns width x height data structure with mines at flat indices mine_squares and numbers"""
+        field = self.get_field_with_value(0)
+        for square in mine_squares:
+            field[square // self.height][square % self.height] = MINE
+
+        self.place_numbers(field)
+        return field
+
+    def get_field_with_value(self, value):
+        """Returns width x height data structure completely filled with VALUE"""
+        revealed_boxes = []
+        for _ in range(self.width):
+            revealed_boxes.append([value] * self.height)
+        return revealed_boxes
+
+    def debug_field(self, board, title=None):
+        """Prints minefield for debug purposes"""
+        if title:
+            print(title)
+        for y in range(len(board)):
+            print([board[x][y] for x in range(len(board[y]))])
+        print()
+
+    def load_neighbour_table(self):
+        """Returns the NeighbourTable shared by every game of this size"""
+        return get_neighbour_table(self.width, self.height)
+
+    def get_neighbour_squares(self, square):
+        """Returns tuple of squares that are adjacent to specified square"""
+        return self.neighbours.get_squares(square[0], square[1])
+
+    def get_uncertain_neighbours(self, square, available_info):
+        """Returns adjacent squares that are uncertain (flagged not included)"""
+        hidden_squares = []
+        for x, y in self.get_neighbour_squares(square):
+            if available_info[x][y] == HIDDEN:
+                hidden_squares.append([x, y])
+        return hidden_squares
+
+    def get_flagged_neighbours(self, square, available_info):
+        """Returns adjacent squares that have been flagged"""
+        flagged_squares = []
+        for x, y in self.get_neighbour_squares(square):
+            if available_info[x][y] == FLAGGED:
+                flagged_squares.append([x, y])
+        return flagged_squares
+
+    def get_hidden_neighbours(self, square, available_info):
+        """Returns adjacent squares that have not been clicked yet"""
+        hidden = self.get_uncertain_neighbours(square, available_info)
+        hidden.extend(self.get_flagged_neighbours(square, available_info))
+        return hidden
+
+    def get_AI_flagged_squares(self, available_info):
+        """Returns list of squares that are sure to contain mines"""
+        flagged_squares = []
+
+        for x, y in [(x, y) for x in range(len(available_info)) for y in range(len(available_info[x]))]:
+            neighbours = self.get_hidden_neighbours([x, y], available_info)
+            if available_info[x][y] == len(neighbours):
+                unflagged = [square for square in neighbours
+                             if available_info[square[0]][square[1]] == HIDDEN and
+                             square not in flagged_squares]
+                flagged_squares.extend(unflagged)
+
+        return flagged_squares
+
+    def get_AI_revealed_squares(self, available_info, guess=False):
+        """Returns list of squares that are sure to NOT contain mines"""
+        revealed_squares = []
+
+        for x in range(self.width):
+            for y in range(self.height):
+                flagged = self.get_flagged_neighbours([x, y], available_info)
+                if available_info[x][y] == len(flagged):
+                    revealed_squares.extend(self.get_uncertain_neighbours([x, y], available_info))
+
+        if not revealed_squares and guess:
+            revealed_squares.append([self.rng.choice(range(self.width)), self.rng.choice(range(self.height))])
+
+        return revealed_squares
+
+    @metrics.timed('ai')
+    def get_AI_input(self, info):
+        """Returns both the safe squares and the flagged squares"""
+        if self.solver:
+            changed_squares, self.changed_squares = self.changed_squares, []
+            return self.solver.get_AI_input(info, changed_squares)
+
+        # TODO: Apply flagged squares to game state before calculating safe squares
+        flagged_squares = self.get_AI_flagged_squares(info)
+        revealed_squares = self.get_AI_revealed_squares(info, guess=True)
+        return revealed_squares, flagged_squares
+
+    def close(self):
+        """Writes buffered turns and closes the turn log"""
+        if self.database:
+            self.database.close()
+
+
+class ArrayMinesweeper(Minesweeper):
+    """Minesweeper backed by int8/bool NumPy arrays instead of nested lists
+
+    mine_field holds adjacency counts with MINE_VALUE for mines, revealed_boxes and flagged_mines are bool masks,
+    so a game costs three bytes per box and whole-board operations are single vectorized passes.
+    """
+
+    @metrics.timed('available_info')
+    def available_info(self):
+        """Returns int8 array with counts for revealed boxes, HIDDEN, FLAGGED, and MINE_VALUE for revealed mines
+
+        The array is a read-only view of the game's observation buffer, no copy is made.
+        """
+        info = self.observation.view()
+        info.flags.writeable = False
+        return info
+
+    def show_mines(self):
+        """Modifies revealed_boxes data structure if chosen box_x & box_y is X"""
+        hidden_mines = (self.mine_field == MINE_VALUE) & ~self.revealed_boxes
+        if self.journal is not None:
+            self.journal.extend((x, y, False) for x, y in np.argwhere(hidden_mines).tolist())
+        self.revealed_boxes |= hidden_mines
+        self.observation[hidden_mines & ~self.flagged_mines] = MINE_VALUE
+
+    def is_there_mine(self, field, x, y):
+        """Checks if mine is located at specific box on field"""
+        return field[x, y] == MINE_VALUE
+
+    def get_mine_bitmap(self):
+        """Returns the mine layout as a flat x * height + y bool array"""
+        return (self.mine_field == MINE_VALUE).ravel()
+
+    def place_numbers(self, field):
+        """Places numbers in width x height array with one padded sum over the 8 neighbour offsets"""
+        mines = field == MINE_VALUE
+        padded = np.pad(mines, 1).astype(np.int8)
+        counts = np.zeros(field.shape, dtype=np.int8)
+        for i in range(3):
+            for j in range(3):
+                if i != 1 or j != 1:
+                    counts += padded[i:i + self.width, j:j + self.height]
+        field[~mines] = counts[~mines]
+
+    @metrics.timed('place_board')
+    def get_minefield(self, mine_squares):
+        """Returns width x height array with mines at flat indices mine_squares and numbers"""
+        field = self.get_field_with_value(0)
+        field.flat[list(mine_squares)] = MINE_VALUE
+
+        self.place_numbers(field)
+        return field
+
+    def get_field_with_value(self, value):
+        """Returns width x height array completely filled with VALUE"""
+        dtype = np.bool_ if isinstance(value, bool) else np.int8
+        return np.full((self.width, self.height), value, dtype=dtype)
+
+
+def get_mine_squares(width, height, mines, rng, safe_square=None, safe_neighbours=False):
+    """Samples mine positions as flat x * height + y indices in one step
+
+    No mine is placed on safe_square, nor on its neighbours if safe_neighbours and there is room to spare.
+    """
+    if safe_square is None:
+        return rng.sample(range(width * height), mines)
+
+    excluded = {safe_square}
+    if safe_neighbours and mines <= width * height - 9:
+        excluded.update(get_neighbour_table(width, height).get_squares(*safe_square))
+
+    # sample among the remaining squares, then shift every index past the excluded ones below it
+    skipped = sorted(x * height + y for x, y in excluded)
+    squares = []
+    for square in sorted(rng.sample(range(width * height - len(skipped)), mines)):
+        for excluded_square in skipped:
+            if excluded_square <= square:
+                square += 1
+        squares.append(square)
+    return squares
+
+
+class NeighbourTable:
+    """Adjacency of a width x height field in CSR form, built once per field size by get_neighbour_table
+
+    The neighbours of the flat square s = x * height + y are the flat squares indices[offsets[s]:offsets[s + 1]],
+    kept in two int32 arrays of about 36 bytes per box whatever the engine or field size. get_squares decodes them
+    to (x, y) squares and keeps up to NEIGHBOUR_DECODE_CACHE_SIZE decoded boxes, enough for the frontier.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        x, y = np.divmod(np.arange(width * height, dtype=np.int32), height)
+        neighbours = np.empty((width * height, 8), dtype=np.int32)
+        inside = np.empty((width * height, 8), dtype=np.bool_)
+        offsets = [(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j]
+        for column, (i, j) in enumerate(offsets):
+            neighbours[:, column] = (x + i) * height + y + j
+            inside[:, column] = (0 <= x + i) & (x + i < width) & (0 <= y + j) & (y + j < height)
+
+        self.offsets = np.zeros(width * height + 1, dtype=np.int32)
+        np.cumsum(np.count_nonzero(inside, axis=1), out=self.offsets[1:])
+        self.indices = neighbours[inside]
+
+        # memoryviews index to plain ints, far faster than NumPy scalars for the per-square lookups
+        self.offset_view = memoryview(self.offsets)
+        self.index_view = memoryview(self.indices)
+        self.heights = (height,) * 8
+        self.decoded = {}
+
+    def get_squares(self, x, y):
+        """Returns tuple of the (x, y) squares adjacent to (x, y)"""
+        square = x * self.height + y
+        squares = self.decoded.get(square)
+        if squares is None:
+            offsets = self.offset_view
+            squares = tuple(map(divmod, self.index_view[offsets[square]:offsets[square + 1]], self.heights))
+            if len(self.decoded) >= NEIGHBOUR_DECODE_CACHE_SIZE:
+                self.decoded.clear()
+            self.decoded[square] = squares
+        return squares
+
+    def get_neighbourhood(self, squares):
+        """Returns the set of (x, y) squares that are in squares or adjacent to one of them, in one NumPy pass"""
+        squares = np.array(squares, dtype=np.int64).reshape(-1, 2)
+        flat = squares[:, 0] * self.height + squares[:, 1]
+        starts = self.offsets[flat]
+        counts = self.offsets[flat + 1] - starts
+        positions = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        flat = np.unique(np.concatenate([flat, self.indices[positions]]))
+        x, y = np.divmod(flat, self.height)
+        return set(zip(x.tolist(), y.tolist()))
+
+
+@functools.lru_cache(maxsize=NEIGHBOUR_TABLE_CACHE_SIZE)
+def get_neighbour_table(width, height):
+    """Returns the NeighbourTable of a field size, shared by every game of that size"""
+    return NeighbourTable(width, height)
@@ -0,0 +1,232 @@
+"""Low-overhead instrumentation of the engine and solver hot paths
+
+Instrumented phases record call counts and log-scale timing histograms while metrics are enabled, and the time
+spent in each phase during one game is folded into a per-game histogram when the next game starts. Snapshots are
+plain dicts that can be merged across processes and written as JSON or Prometheus text.
+
+    import metrics
+    metrics.enable()
+    ...
+    metrics.write_snapshot('metrics.prom')
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import math
+import os
+import pstats
+import time
+from collections import defaultdict
+
+# timings are kept in a log-scale histogram so snapshots can be merged without keeping every sample
+LATENCY_BUCKETS_PER_OCTAVE = 8
+LATENCY_BUCKET_COUNT = 40 * LATENCY_BUCKETS_PER_OCTAVE  # covers 1 ns up to ~1000 s
+PROMETHEUS_PREFIX = 'minesweeper'
+
+ENABLED = False
+
+COUNTERS = defaultdict(int)  # name -> count
+TIMINGS = {}  # phase -> [calls, seconds, histogram]
+GAME_SECONDS = defaultdict(float)  # phase -> seconds spent in it during the current game
+
+
+def latency_bucket(seconds):
+    """Returns histogram bucket index for a latency in seconds"""
+    nanoseconds = max(seconds * 1e9, 1.0)
+    return min(int(math.log2(nanoseconds) * LATENCY_BUCKETS_PER_OCTAVE), LATENCY_BUCKET_COUNT - 1)
+
+
+def get_bucket_bound(bucket):
+    """Returns upper bound in seconds of a histogram bucket"""
+    return 2 ** ((bucket + 1) / LATENCY_BUCKETS_PER_OCTAVE) / 1e9
+
+
+def latency_percentile(histogram, percentile):
+    """Returns upper bound in seconds of the histogram bucket that holds the given percentile"""
+    total = sum(histogram)
+    if not total:
+        return None
+
+    threshold = total * percentile / 100.0
+    cumulative = 0
+    for bucket, count in enumerate(histogram):
+        cumulative += count
+        if cumulative >= threshold:
+            return get_bucket_bound(bucket)
+    return None
+
+
+def enable():
+    """Starts recording, can be called at any point of a run"""
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    """Stops recording, what was recorded so far is kept"""
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """Forgets everything recorded so far"""
+    COUNTERS.clear()
+    TIMINGS.clear()
+    GAME_SECONDS.clear()
+
+
+def count(name, amount=1):
+    """Adds amount to a counter"""
+    if ENABLED:
+        COUNTERS[name] += amount
+
+
+def observe(phase, seconds):
+    """Records one call of a phase that took seconds"""
+    timing = TIMINGS.get(phase)
+    if timing is None:
+        timing = TIMINGS[phase] = [0, 0.0, [0] * LATENCY_BUCKET_COUNT]
+    timing[0] += 1
+    timing[1] += seconds
+    timing[2][latency_bucket(seconds)] += 1
+
+
+def record(phase, seconds):
+    """Records one call of an instrumented phase and adds it to the current game"""
+    observe(phase, seconds)
+    GAME_SECONDS[phase] += seconds
+
+
+def end_game():
+    """Folds the time spent in each phase by the game that just ended into the per-game histograms"""
+    if not ENABLED or not GAME_SECONDS:
+        return
+    COUNTERS['games'] += 1
+    for phase, seconds in GAME_SECONDS.items():
+        observe('game.' + phase, seconds)
+    GAME_SECONDS.clear()
+
+
+def timed(phase):
+    """Decorator recording every call of the function as phase while metrics are enabled"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(phase, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class Timer:
+    """Context manager recording the time spent in its block as one call of phase"""
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.phase, time.perf_counter() - self.start)
+
+
+def timer(phase):
+    """Returns a Timer for phase, or a no-op context manager while metrics are disabled"""
+    return Timer(phase) if ENABLED else contextlib.nullcontext()
+
+
+def snapshot():
+    """Returns everything recorded so far as a JSON-serializable dict"""
+    return {
+        'counters': dict(COUNTERS),
+        'timings': {
+            phase: {'calls': calls, 'seconds': seconds, 'histogram': list(histogram)}
+            for phase, (calls, seconds, histogram) in TIMINGS.items()
+        },
+    }
+
+
+def merge_snapshot(total, partial):
+    """Adds a partial snapshot, e.g. from a worker process, into total"""
+    for name, amount in partial['counters'].items():
+        total['counters'][name] = total['counters'].get(name, 0) + amount
+    for phase, timing in partial['timings'].items():
+        if phase not in total['timings']:
+            total['timings'][phase] = {'calls': 0, 'seconds': 0.0, 'histogram': [0] * LATENCY_BUCKET_COUNT}
+        merged = total['timings'][phase]
+        merged['calls'] += timing['calls']
+        merged['seconds'] += timing['seconds']
+        for bucket, calls in enumerate(timing['histogram']):
+            merged['histogram'][bucket] += calls
+
+
+def get_prometheus_name(name):
+    """Returns a counter or phase name as a valid Prometheus metric name part"""
+    return ''.join(character if character.isalnum() else '_' for character in name)
+
+
+def format_prometheus(data):
+    """Returns a snapshot in the Prometheus text exposition format
+
+    Phases become one histogram with a phase label, only the buckets that hold calls are written.
+    """
+    lines = []
+    for name, amount in sorted(data['counters'].items()):
+        metric = '{}_{}_total'.format(PROMETHEUS_PREFIX, get_prometheus_name(name))
+        lines.append('# TYPE {} counter'.format(metric))
+        lines.append('{} {}'.format(metric, amount))
+
+    metric = '{}_phase_seconds'.format(PROMETHEUS_PREFIX)
+    lines.append('# TYPE {} histogram'.format(metric))
+    for phase, timing in sorted(data['timings'].items()):
+        cumulative = 0
+        for bucket, calls in enumerate(timing['histogram']):
+            if calls:
+                cumulative += calls
+                lines.append('{}_bucket{{phase="{}",le="{:.9g}"}} {}'.format(
+                    metric, phase, get_bucket_bound(bucket), cumulative))
+        lines.append('{}_bucket{{phase="{}",le="+Inf"}} {}'.format(metric, phase, timing['calls']))
+        lines.append('{}_sum{{phase="{}"}} {!r}'.format(metric, phase, timing['seconds']))
+        lines.append('{}_count{{phase="{}"}} {}'.format(metric, phase, timing['calls']))
+
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def write_snapshot(filename, data=None):
+    """Writes a snapshot (the current one by default) as Prometheus text for .prom files, else as JSON
+
+    The file is replaced atomically so a scraper never reads half a snapshot.
+    """
+    data = snapshot() if data is None else data
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'w') as snapshot_file:
+        if filename.endswith('.prom'):
+            snapshot_file.write(format_prometheus(data))
+        else:
+            json.dump(data, snapshot_file, indent=2)
+    os.replace(temporary_filename, filename)
+
+
+@contextlib.contextmanager
+def profile_session(filename):
+    """Runs the block under cProfile and adds its statistics to the pstats file filename"""
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        stats = pstats.Stats(profile)
+        if os.path.exists(filename):
+            stats.add(filename)
+        stats.dump_stats(filename)
@@ -1,33 +1,33 @@
-import json
+import contextlib
 import os
-import random
 import sys
 
-import pygame
-from pygame.locals import *
+import engine
+import metrics
+import replay
+
+pygame = None  # imported by load_pygame once a window is needed, headless runs never load it
 
 # AI
 AI_ENABLED = True
 
-# DIFFICULTY
-TEST = (4, 4, 2)
-BEGINNER = (8, 8, 10)
-INTERMEDIATE = (16, 16, 40)
-EXPERT = (24, 24, 99)
+# ENGINE
+ARRAY_ENGINE = False  # store the board as compact NumPy arrays (see engine.ArrayMinesweeper)
 
-FIELDWIDTH, FIELDHEIGHT, MINESTOTAL = TEST
+# METRICS
+METRICS_FILENAME = None  # record phase metrics and write snapshots here, '.prom' for Prometheus text, else JSON
+METRICS_INTERVAL = 100  # games between snapshots
+PROFILE_FILENAME = None  # run under cProfile and write pstats here when the game exits
 
-# PERSISTENT DATA
-LOG_TO_FILE = False
-DATABASE_FILENAME = 'data.txt'
+# REPLAYS
+REPLAY_FILENAME = None  # append every finished game to this replay file (see replay.py)
 
 # UI
 UI_ENABLED = False
 FPS = 30
 BOXSIZE = 30
-WINDOWWIDTH = FIELDWIDTH * BOXSIZE + 85
-WINDOWHEIGHT = FIELDWIDTH * BOXSIZE + 135
-XMARGIN = int((WINDOWWIDTH - (FIELDWIDTH * BOXSIZE)) / 2)
+WINDOWPADDING = 85  # window size around the field, the field is centered horizontally below the smiley
+XMARGIN = int(WINDOWPADDING / 2)
 YMARGIN = XMARGIN + 50
 
 # INPUT
@@ -35,8 +35,6 @@ LEFT_CLICK = 1
 RIGHT_CLICK = 3
 
 # assertions
-assert MINESTOTAL < FIELDHEIGHT * FIELDWIDTH, 'More mines than boxes'
-assert BOXSIZE ^ 2 * (FIELDHEIGHT * FIELDWIDTH) < WINDOWHEIGHT * WINDOWWIDTH, 'Boxes will not fit on screen'
 assert BOXSIZE / 2 > 5, 'Bounding errors when drawing rectangle, cannot use half-5 in draw_mines_numbers'
 
 # COLORS
@@ -54,27 +52,33 @@ RESETBGCOLOR = LIGHTGRAY
 FONTTYPE = 'Courier New'
 FONTSIZE = 20
 
-MINE = 'X'
-FLAGGED = -2
-HIDDEN = -1
+
+def load_pygame():
+    """Imports pygame into this module on first use"""
+    global pygame
+    if pygame is None:
+        import pygame
 
 
-class Minesweeper:
-    def __init__(self, ui=True):
-        # random.seed(0)  # Seed the RNG for DEBUG purposes
-        self.mine_field, self.revealed_boxes, self.flagged_mines = self.new_game()
+class MinesweeperUI:
+    """pygame window for a game engine class, mixed in before engine.Minesweeper or engine.ArrayMinesweeper"""
 
+    def __init__(self, ui=True, ai_mode=None, predictor=None, difficulty=None):
+        super().__init__(ai_mode, predictor, difficulty)
         if ui:
+            load_pygame()
             pygame.init()
             pygame.display.set_caption('Minesweeper')
 
             self.clock = pygame.time.Clock()
 
             # load GUI
-            self._display_surface = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+            window_width = self.width * BOXSIZE + WINDOWPADDING
+            window_height = self.height * BOXSIZE + WINDOWPADDING + 50
+            self._display_surface = pygame.display.set_mode((window_width, window_height))
             self._BASICFONT = pygame.font.SysFont(FONTTYPE, FONTSIZE)
-            self._RESET_SURF, self._RESET_RECT = self.draw_smiley(WINDOWWIDTH / 2, 50)
-            # self._RESET_SURF, self._RESET_RECT = self.draw_button('RESET', TEXTCOLOR, RESETBGCOLOR, WINDOWWIDTH/2, 50)
+            self._RESET_SURF, self._RESET_RECT = self.draw_smiley(window_width / 2, 50)
+            # self._RESET_SURF, self._RESET_RECT = self.draw_button('RESET', TEXTCOLOR, RESETBGCOLOR, window_width/2, 50)
             self._images = {
                 '0': pygame.transform.scale(pygame.image.load(os.path.join('media', '0.png')), (BOXSIZE, BOXSIZE)),
                 '1': pygame.transform.scale(pygame.image.load(os.path.join('media', '1.png')), (BOXSIZE, BOXSIZE)),
@@ -91,166 +95,77 @@ class Minesweeper:
                 'mine': pygame.transform.scale(pygame.image.load(os.path.join('media', 'mine.png')), (BOXSIZE, BOXSIZE)),
             }
 
-        if LOG_TO_FILE:
-            self.database = open(DATABASE_FILENAME, 'a')
-        else:
-            self.database = None
-
-    def new_game(self):
-        """Set up mine field data structure, list of all zeros for recursion, and revealed box boolean data structure"""
-        self.mine_field = self.get_random_minefield()
-        self.revealed_boxes = self.get_field_with_value(False)
-        self.flagged_mines = self.get_field_with_value(False)
-
-        return self.mine_field, self.revealed_boxes, self.flagged_mines
-
     def get_image(self, box_x, box_y):
         if self.flagged_mines[box_x][box_y]:
             return self._images.get('flag')
         if self.revealed_boxes[box_x][box_y]:
-            if self.mine_field[box_x][box_y] == MINE:
+            if self.is_there_mine(self.mine_field, box_x, box_y):
                 return self._images.get('mine')
             else:
                 return self._images.get(str(self.mine_field[box_x][box_y]))
         else:
             return self._images.get('hidden')
 
-    def draw_field(self):
-        """Draws field GUI"""
-        self._display_surface.fill(BGCOLOR)
+    def new_game(self, seed=None, mine_squares=None):
+        """Starts a new game, the next frame redraws the whole window"""
+        self.redraw_all = True
+        self.dirty_squares = set()  # boxes to redraw on the next frame
+        self.highlighted_rects = []  # highlight outlines to erase on the next frame
+        return super().new_game(seed, mine_squares)
 
-        for box_x in range(FIELDWIDTH):
-            for box_y in range(FIELDHEIGHT):
-                left, top = self.get_left_top_xy(box_x, box_y)
-                self._display_surface.blit(self.get_image(box_x, box_y), (left, top))
+    def update_observation(self, x, y):
+        """Refreshes the available_info value of a single box and marks it for redrawing"""
+        super().update_observation(x, y)
+        self.dirty_squares.add((x, y))
 
-        self._display_surface.blit(self._RESET_SURF, self._RESET_RECT)
+    def show_mines(self):
+        """Reveals every mine, the next frame redraws the whole window"""
+        super().show_mines()
+        self.redraw_all = True
+
+    def draw_field(self):
+        """Draws the boxes that changed since the last frame, returns the rects to pass to pygame.display.update"""
+        if self.redraw_all:
+            self._display_surface.fill(BGCOLOR)
+            for box_x in range(self.width):
+                for box_y in range(self.height):
+                    left, top = self.get_left_top_xy(box_x, box_y)
+                    self._display_surface.blit(self.get_image(box_x, box_y), (left, top))
+            self._display_surface.blit(self._RESET_SURF, self._RESET_RECT)
+
+            self.redraw_all = False
+            self.dirty_squares.clear()
+            self.highlighted_rects = []
+            return [self._display_surface.get_rect()]
+
+        updated_rects = []
+        for rect in self.highlighted_rects:
+            updated_rects.append(self._display_surface.fill(BGCOLOR, rect))
+        if self.highlighted_rects:
+            self._display_surface.blit(self._RESET_SURF, self._RESET_RECT)
+        self.highlighted_rects = []
+
+        for box_x, box_y in self.dirty_squares:
+            left, top = self.get_left_top_xy(box_x, box_y)
+            updated_rects.append(self._display_surface.blit(self.get_image(box_x, box_y), (left, top)))
+        self.dirty_squares.clear()
+
+        return updated_rects
 
     def highlight_box(self, box_x, box_y):
-        """Highlight box when mouse hovers over it"""
+        """Highlight box when mouse hovers over it, returns the rect drawn"""
         left, top = self.get_left_top_xy(box_x, box_y)
-        pygame.draw.rect(self._display_surface, HIGHLIGHTCOLOR, (left, top, BOXSIZE, BOXSIZE), 4)
+        self.dirty_squares.add((box_x, box_y))  # the box image covers the outline again on the next frame
+        return pygame.draw.rect(self._display_surface, HIGHLIGHTCOLOR, (left, top, BOXSIZE, BOXSIZE), 4)
 
     def highlight_button(self, butRect):
-        """Highlight button when mouse hovers over it"""
+        """Highlight button when mouse hovers over it, returns the rect drawn"""
         linewidth = 4
-        pygame.draw.rect(self._display_surface, HIGHLIGHTCOLOR, (
+        rect = pygame.draw.rect(self._display_surface, HIGHLIGHTCOLOR, (
         butRect.left - linewidth, butRect.top - linewidth, butRect.width + 2 * linewidth,
         butRect.height + 2 * linewidth), linewidth)
-
-    def is_game_won(self):
-        """Checks if player has revealed all boxes"""
-        not_mine_count = 0
-
-        for box_x in range(FIELDWIDTH):
-            for box_y in range(FIELDHEIGHT):
-                if self.revealed_boxes[box_x][box_y]:
-                    if self.mine_field[box_x][box_y] != MINE:
-                        not_mine_count += 1
-
-        if not_mine_count >= (FIELDWIDTH * FIELDHEIGHT) - MINESTOTAL:
-            return True
-        else:
-            return False
-
-    def save_turn(self, selected_square):
-        info = self.available_info()
-
-        if self.mine_field[selected_square[0]][selected_square[1]] == MINE:
-            score = 0
-        else:
-            total_revealed_squares = (FIELDHEIGHT*FIELDWIDTH) - MINESTOTAL
-            revealed_count = sum(column.count(True) for column in self.revealed_boxes)
-            score = float(revealed_count)/float(total_revealed_squares)
-
-        database_entry = json.dumps({
-            "turn": info,
-            "move": selected_square,
-            "score": score,
-        })
-        self.database.write(database_entry)
-        self.database.write('\n')
-
-    def available_info(self):
-        info = []
-
-        for x in range(len(self.mine_field)):
-            line = []
-            for y in range(len(self.mine_field[x])):
-                if self.flagged_mines[x][y]:
-                    line.append(FLAGGED)
-                else:
-                    try:
-                        line.append(int(self.mine_field[x][y]) if self.revealed_boxes[x][y] else HIDDEN)
-                    except:
-                        line.append('X')
-            info.append(line)
-
-        # self.debug_field(info, 'info')
-        return info
-
-    def toggle_flag_box(self, x, y):
-        """Toggles if mine box is flagged"""
-        if not self.flagged_mines[x][y] and not self.revealed_boxes[x][y]:
-            self.flagged_mines[x][y] = True
-        else:
-            self.flagged_mines[x][y] = False
-
-    def reveal_box(self, x, y):
-        """Reveals box clicked"""
-        has_game_ended = False
-        self.revealed_boxes[x][y] = True
-
-        if self.is_game_won():
-            has_game_ended = True
-
-        # when 0 is revealed, show relevant boxes
-        if self.mine_field[x][y] == 0:
-            self.reveal_empty_squares(x, y)
-
-        # when mine is revealed, show mines
-        if self.mine_field[x][y] == MINE:
-            self.show_mines()
-            has_game_ended = True
-
-        return has_game_ended
-
-    def reveal_empty_squares(self, box_x, box_y, zero_list_xy=[]):
-        """Modifies revealed_boxes data structure if chosen box_x & box_y is 0
-        Shows all boxes using recursion
-        """
-        self.revealed_boxes[box_x][box_y] = True
-        self.reveal_adjacent_boxes(box_x, box_y)
-        for i, j in self.get_neighbour_squares([box_x, box_y]):
-            if self.mine_field[i][j] == 0 and [i, j] not in zero_list_xy:
-                zero_list_xy.append([i, j])
-                self.reveal_empty_squares(i, j, zero_list_xy)
-
-    def reveal_adjacent_boxes(self, box_x, box_y):
-        """Modifies revealed_boxes data structure so that all adjacent boxes to (box_x, box_y) are set to True"""
-        if box_x != 0:
-            self.revealed_boxes[box_x - 1][box_y] = True
-            if box_y != 0:
-                self.revealed_boxes[box_x - 1][box_y - 1] = True
-            if box_y != FIELDHEIGHT - 1:
-                self.revealed_boxes[box_x - 1][box_y + 1] = True
-        if box_x != FIELDWIDTH - 1:
-            self.revealed_boxes[box_x + 1][box_y] = True
-            if box_y != 0:
-                self.revealed_boxes[box_x + 1][box_y - 1] = True
-            if box_y != FIELDHEIGHT - 1:
-                self.revealed_boxes[box_x + 1][box_y + 1] = True
-        if box_y != 0:
-            self.revealed_boxes[box_x][box_y - 1] = True
-        if box_y != FIELDHEIGHT - 1:
-            self.revealed_boxes[box_x][box_y + 1] = True
-
-    def show_mines(self):
-        """Modifies revealed_boxes data structure if chosen box_x & box_y is X"""
-        for i in range(FIELDWIDTH):
-            for j in range(FIELDHEIGHT):
-                if self.mine_field[i][j] == MINE:
-                    self.revealed_boxes[i][j] = True
+        self.highlighted_rects.append(rect)
+        return rect
 
     def draw_button(self, text, color, bgcolor, center_x, center_y):
         """Similar to draw_text but text has bg color and returns obj & rect"""
@@ -269,50 +184,6 @@ class Minesweeper:
         rect.centery = center_y
         return surface, rect
 
-    def is_there_mine(self, field, x, y):
-        """Checks if mine is located at specific box on field"""
-        return field[x][y] == MINE
-
-    def place_numbers(self, field):
-        """Places numbers in FIELDWIDTH x FIELDHEIGHT data structure"""
-        for x in range(FIELDWIDTH):
-            for y in range(FIELDHEIGHT):
-                if not self.is_there_mine(field, x, y):
-                    field[x][y] = [
-                        field[neighbour_x][neighbour_y]
-                        for neighbour_x, neighbour_y in self.get_neighbour_squares([x, y])
-                    ].count(MINE)
-
-    def get_random_minefield(self):
-        """Places mines in FIELDWIDTH x FIELDHEIGHT data structure"""
-        field = self.get_field_with_value(0)
-        mine_count = 0
-        xy = []
-        while mine_count < MINESTOTAL:
-            x = random.randint(0, FIELDWIDTH - 1)
-            y = random.randint(0, FIELDHEIGHT - 1)
-            if [x, y] not in xy:
-                xy.append([x, y])
-                field[x][y] = MINE
-                mine_count += 1
-
-        self.place_numbers(field)
-        return field
-
-    def get_field_with_value(self, value):
-        """Returns FIELDWIDTH x FIELDHEIGHT data structure completely filled with VALUE"""
-        revealed_boxes = []
-        for _ in range(FIELDWIDTH):
-            revealed_boxes.append([value] * FIELDHEIGHT)
-        return revealed_boxes
-
-    def terminate(self):
-        """Simple function to exit game"""
-        if self.database:
-            self.database.close()
-        pygame.quit()
-        sys.exit()
-
     def draw_text(self, text, font, color, surface, x, y):
         """Function to easily draw text and also return object & rect pair"""
         textobj = font.render(text, True, color)
@@ -335,107 +206,45 @@ class Minesweeper:
 
     def get_box_at_pixel(self, x, y):
         """Gets coordinates of box at mouse coordinates"""
-        for box_x in range(FIELDWIDTH):
-            for box_y in range(FIELDHEIGHT):
-                left, top = self.get_left_top_xy(box_x, box_y)
-                boxRect = pygame.Rect(left, top, BOXSIZE, BOXSIZE)
-                if boxRect.collidepoint(x, y):
-                    return (box_x, box_y)
+        box_x = (x - XMARGIN) // BOXSIZE
+        box_y = (y - YMARGIN) // BOXSIZE
+        if 0 <= box_x < self.width and 0 <= box_y < self.height:
+            return (box_x, box_y)
         return (None, None)
 
-    def debug_field(self, board, title=None):
-        """Prints minefield for debug purposes"""
-        if title:
-            print(title)
-        for y in range(len(board)):
-            print([board[x][y] for x in range(len(board[y]))])
-        print()
-
-    def get_neighbour_squares(self, square, min_x=0, max_x=FIELDWIDTH - 1, min_y=0, max_y=FIELDHEIGHT - 1):
-        """Returns list of squares that are adjacent to specified square"""
-        neighbours = []
-        for i in range(-1, 2):
-            for j in range(-1, 2):
-                neighbours.append([square[0] + i, square[1] + j])
-        neighbours.remove(square)
-
-        if min_x is not None:
-            neighbours = [item for item in neighbours if item[0] >= min_x]
-
-        if max_x is not None:
-            neighbours = [item for item in neighbours if item[0] <= max_x]
-
-        if min_y is not None:
-            neighbours = [item for item in neighbours if item[1] >= min_y]
-
-        if max_y is not None:
-            neighbours = [item for item in neighbours if item[1] <= max_y]
-
-        return neighbours
-
-    def get_uncertain_neighbours(self, square, available_info):
-        """Returns adjacent squares that are uncertain (flagged not included)"""
-        hidden_squares = []
-        for x, y in self.get_neighbour_squares(square):
-            if available_info[x][y] == HIDDEN:
-                hidden_squares.append([x, y])
-        return hidden_squares
-
-    def get_flagged_neighbours(self, square, available_info):
-        """Returns adjacent squares that have been flagged"""
-        flagged_squares = []
-        for x, y in self.get_neighbour_squares(square):
-            if available_info[x][y] == FLAGGED:
-                flagged_squares.append([x, y])
-        return flagged_squares
-
-    def get_hidden_neighbours(self, square, available_info):
-        """Returns adjacent squares that have not been clicked yet"""
-        hidden = self.get_uncertain_neighbours(square, available_info)
-        hidden.extend(self.get_flagged_neighbours(square, available_info))
-        return hidden
-
-    def get_AI_flagged_squares(self, available_info):
-        """Returns list of squares that are sure to contain mines"""
-        flagged_squares = []
-
-        for x, y in [(x, y) for x in range(len(available_info)) for y in range(len(available_info[x]))]:
-            neighbours = self.get_hidden_neighbours([x, y], available_info)
-            if available_info[x][y] == len(neighbours):
-                unflagged = [square for square in neighbours
-                             if available_info[square[0]][square[1]] == HIDDEN and
-                             square not in flagged_squares]
-                flagged_squares.extend(unflagged)
-
-        return flagged_squares
-
-    def get_AI_revealed_squares(self, available_info, guess=False):
-        """Returns list of squares that are sure to NOT contain mines"""
-        revealed_squares = []
-
-        for x in range(FIELDWIDTH):
-            for y in range(FIELDHEIGHT):
-                flagged = self.get_flagged_neighbours([x, y], available_info)
-                if available_info[x][y] == len(flagged):
-                    revealed_squares.extend(self.get_uncertain_neighbours([x, y], available_info))
-
-        if not revealed_squares and guess:
-            revealed_squares.append([random.choice(range(FIELDWIDTH)), random.choice(range(FIELDHEIGHT))])
-
-        return revealed_squares
-
-    def get_AI_input(self, info):
-        """Returns both the safe squares and the flagged squares"""
-        # TODO: Apply flagged squares to game state before calculating safe squares
-        flagged_squares = self.get_AI_flagged_squares(info)
-        revealed_squares = self.get_AI_revealed_squares(info, guess=True)
-        return revealed_squares, flagged_squares
+    def terminate(self):
+        """Simple function to exit game"""
+        self.close()
+        if METRICS_FILENAME:
+            metrics.write_snapshot(METRICS_FILENAME)
+        pygame.quit()
+        sys.exit()
+
+
+class Minesweeper(MinesweeperUI, engine.Minesweeper):
+    """List-backed game with an optional window"""
+
+
+class ArrayMinesweeper(MinesweeperUI, engine.ArrayMinesweeper):
+    """Array-backed game with an optional window"""
 
 
 def main():
+    if METRICS_FILENAME:
+        metrics.enable()
+
+    with metrics.profile_session(PROFILE_FILENAME) if PROFILE_FILENAME else contextlib.nullcontext():
+        play()
+
+
+def play():
     tries = 0
+    if UI_ENABLED:
+        load_pygame()
 
-    minesweeper = Minesweeper(ui=UI_ENABLED)
+    game_class = ArrayMinesweeper if ARRAY_ENGINE else Minesweeper
+    minesweeper = game_class(ui=UI_ENABLED)
+    replay_writer = replay.ReplayWriter(REPLAY_FILENAME) if REPLAY_FILENAME else None
 
     # stores XY of mouse events
     mouse_x = 0
@@ -448,6 +257,8 @@ def main():
 
         tries += 1
         print(tries)
+        if METRICS_FILENAME and tries % METRICS_INTERVAL == 0:
+            metrics.write_snapshot(METRICS_FILENAME)
 
         # Main game loop
         while not has_game_ended:
@@ -457,16 +268,19 @@ def main():
             flagged_squares = []
 
             if UI_ENABLED:
-                # Draw screen
-                minesweeper.draw_field()
+                # Draw the boxes that changed since the last frame
+                updated_rects = minesweeper.draw_field()
 
                 # Get player input
                 for event in pygame.event.get():
-                    if event.type == QUIT or (event.type == KEYDOWN and (event.key == K_ESCAPE or event.key == K_q)):
+                    if event.type == pygame.QUIT or (
+                            event.type == pygame.KEYDOWN and event.key in (pygame.K_ESCAPE, pygame.K_q)):
                         minesweeper.terminate()
-                    elif event.type == MOUSEMOTION:
+                    elif event.type == pygame.VIDEOEXPOSE:
+                        minesweeper.redraw_all = True
+                    elif event.type == pygame.MOUSEMOTION:
                         mouse_x, mouse_y = event.pos
-                    elif event.type == MOUSEBUTTONDOWN:
+                    elif event.type == pygame.MOUSEBUTTONDOWN:
                         if event.button == LEFT_CLICK:
                             mouse_x, mouse_y = event.pos
                             mouse_clicked = True
@@ -484,37 +298,38 @@ def main():
                 info = minesweeper.available_info()
                 revealed_squares, flagged_squares = minesweeper.get_AI_input(info)
 
-            # Apply game changes
-            for x, y in flagged_squares:
-                minesweeper.toggle_flag_box(x, y)
-
-            for x, y in revealed_squares:
-                has_game_ended = minesweeper.reveal_box(x, y)
-                if LOG_TO_FILE:
-                    minesweeper.save_turn([x, y])
-                if has_game_ended:
-                    break
+            # Apply game changes, logging each move with the board it was chosen on
+            if engine.LOG_TO_FILE:
+                board = minesweeper.get_info_snapshot()
+            result = minesweeper.apply_moves(revealed_squares, flagged_squares)
+            has_game_ended = result.mine_hit or result.won
+            if engine.LOG_TO_FILE:
+                for x, y in result.moves:
+                    minesweeper.save_turn([x, y], board)
 
             if UI_ENABLED:
                 # Check if reset box is clicked
                 if minesweeper._RESET_RECT.collidepoint(mouse_x, mouse_y):
-                    minesweeper.highlight_button(minesweeper._RESET_RECT)
+                    updated_rects.append(minesweeper.highlight_button(minesweeper._RESET_RECT))
                     if mouse_clicked:
                         minesweeper.new_game()
 
                 # Highlight unrevealed box
                 box_x, box_y = minesweeper.get_box_at_pixel(mouse_x, mouse_y)
                 if box_x is not None and box_y is not None and not minesweeper.revealed_boxes[box_x][box_y]:
-                    minesweeper.highlight_box(box_x, box_y)
+                    updated_rects.append(minesweeper.highlight_box(box_x, box_y))
 
             if minesweeper.is_game_won():
                 break
 
             if UI_ENABLED:
-                # Update screen, wait clock tick
-                pygame.display.update()
+                # Update the changed parts of the screen, wait clock tick
+                pygame.display.update(updated_rects)
                 minesweeper.clock.tick(FPS)
 
+        if replay_writer:
+            replay_writer.write_game(minesweeper)
+
 
 if __name__ == '__main__':
     main()
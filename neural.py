@@ -1,120 +1,206 @@
-import json
-import numpy as np
-import tensorflow as tf
-
-tf.logging.set_verbosity(tf.logging.INFO)
-
-DATABASE_FILENAME = 'data.txt'
-
-
-def load_data(filename):
-    turns = []
-    moves = []
-    scores = []
-
-    with open(filename, 'r') as database:
-        for line in database:
-            entry = json.loads(line)
-            if entry['score'] == 0:
-                continue
-
-            flat_turn = [item for sublist in entry['turn'] for item in sublist]
-            turns.append(np.array(flat_turn))
-
-            moves.append(np.array(entry['move']))
-
-            scores.append(np.array(entry['score']))
-            break
-
-    return {
-        "turns": np.array(turns),
-        "moves": np.array(moves),
-        "scores": np.array(scores),
-    }
-
-
-def main(args):
-    data = load_data(DATABASE_FILENAME)
-    return
-
-    # Create the Estimator
-    mnist_classifier = tf.estimator.Estimator(model_fn=cnn_model_fn, model_dir="/tmp/mnist_convnet_model")
-
-    # Set up logging for predictions
-    tensors_to_log = {"probabilities": "softmax_tensor"}
-    logging_hook = tf.train.LoggingTensorHook(tensors=tensors_to_log, every_n_iter=50)
-
-    # Train the model
-    train_input_fn = tf.estimator.inputs.numpy_input_fn(
-        x={"x": train_data},
-        y=train_labels,
-        batch_size=100,
-        num_epochs=None,
-        shuffle=True)
-    mnist_classifier.train(
-        input_fn=train_input_fn,
-        steps=20000,
-        hooks=[logging_hook])
-
-    # # Evaluate the model and print results
-    # eval_input_fn = tf.estimator.inputs.numpy_input_fn(
-    #     x={"x": eval_data},
-    #     y=eval_labels,
-    #     num_epochs=1,
-    #     shuffle=False)
-    # eval_results = mnist_classifier.evaluate(input_fn=eval_input_fn)
-    # print(eval_results)
-
-
-def cnn_model_fn(features, labels, mode):
-    """Model function for CNN."""
-    # Input Layer
-    input_layer = tf.reshape(features["x"], [-1, 8, 8, 1])
-
-    # Convolutional Layer #1
-    conv = tf.layers.conv2d(
-        inputs=input_layer,
-        filters=32,
-        kernel_size=[5, 5],
-        padding="same",
-        activation=tf.nn.relu)
-
-    # Pooling Layer #1
-    pool = tf.layers.max_pooling2d(inputs=conv, pool_size=[2, 2], strides=2)
-
-    # Dense Layer
-    pool_flat = tf.reshape(pool, [-1, 7 * 7 * 64])
-    dense = tf.layers.dense(inputs=pool_flat, units=1024, activation=tf.nn.relu)
-    dropout = tf.layers.dropout(inputs=dense, rate=0.4, training=(mode == tf.estimator.ModeKeys.TRAIN))
-
-    # Logits Layer
-    logits = tf.layers.dense(inputs=dropout, units=10)
-
-    predictions = {
-        # Generate predictions (for PREDICT and EVAL mode)
-        "classes": tf.argmax(input=logits, axis=1),
-        # Add `softmax_tensor` to the graph. It is used for PREDICT and by the `logging_hook`.
-        "probabilities": tf.nn.softmax(logits, name="softmax_tensor"),
-    }
-
-    if mode == tf.estimator.ModeKeys.PREDICT:
-        return tf.estimator.EstimatorSpec(mode=mode, predictions=predictions)
-
-    # Calculate Loss (for both TRAIN and EVAL modes)
-    loss = tf.losses.sparse_softmax_cross_entropy(labels=labels, logits=logits)
-
-    # Configure the Training Op (for TRAIN mode)
-    if mode == tf.estimator.ModeKeys.TRAIN:
-        optimizer = tf.train.GradientDescentOptimizer(learning_rate=0.001)
-        train_op = optimizer.minimize(loss=loss, global_step=tf.train.get_global_step())
-        return tf.estimator.EstimatorSpec(mode=mode, loss=loss, train_op=train_op)
-
-    # Add evaluation metrics (for EVAL mode)
-    eval_metric_ops = {
-        "accuracy": tf.metrics.accuracy(labels=labels, predictions=predictions["classes"])
-    }
-    return tf.estimator.EstimatorSpec(mode=mode, loss=loss, eval_metric_ops=eval_metric_ops)
-
-
-if __name__ == "__main__":
-    tf.app.run()
+import argparse
+import json
+
+import numpy as np
+import tensorflow as tf
+
+import dataset
+
+DATABASE_FILENAME = 'data.txt'
+TURN_LOG_PATTERN = 'data.*.turns'  # binary turn log shards, one field size per run, see engine.TURN_LOG_FILENAME
+BATCH_SIZE = 100
+SHUFFLE_BUFFER = 100000
+MODEL_DIR = '/tmp/minesweeper_model'
+MOVE_MODEL_DIR = '/tmp/minesweeper_move_model'
+TRAIN_STEPS = 20000
+
+# observations range from FLAGGED (-2) to MINE_VALUE (9), see engine.Minesweeper.available_info
+OBSERVATION_OFFSET = 2
+OBSERVATION_VALUES = 12
+HIDDEN = -1
+
+
+def load_data(filename):
+    turns = []
+    moves = []
+    scores = []
+
+    with open(filename, 'r') as database:
+        for line in database:
+            entry = json.loads(line)
+            if entry['score'] == 0:
+                continue
+
+            flat_turn = [item for sublist in entry['turn'] for item in sublist]
+            turns.append(np.array(flat_turn))
+
+            moves.append(np.array(entry['move']))
+
+            scores.append(np.array(entry['score']))
+
+    return {
+        "turns": np.array(turns),
+        "moves": np.array(moves),
+        "scores": np.array(scores),
+    }
+
+
+def train_input_fn(patterns=TURN_LOG_PATTERN, batch_size=BATCH_SIZE, shuffle_buffer=SHUFFLE_BUFFER, epochs=None,
+                   augment=True, deduplicate=True):
+    """Streams (features, labels) batches from memory-mapped turn logs
+
+    Features hold the board and its score, the label is the move as a flat x * height + y index. Turns are
+    deduplicated up to symmetry and every batch gets random rotations/reflections unless disabled.
+    """
+    width, height = dataset.get_field_size(patterns)
+
+    def generator():
+        return dataset.iter_batches(patterns, batch_size, shuffle_buffer, epochs=epochs,
+                                    augment_symmetries=augment, deduplicate_turns=deduplicate)
+
+    batches = tf.data.Dataset.from_generator(
+        generator,
+        output_types=(tf.int8, tf.int16, tf.float32),
+        output_shapes=([batch_size, width, height], [batch_size, 2], [batch_size]))
+
+    def to_features(boards, moves, scores):
+        moves = tf.cast(moves, tf.int32)
+        features = {"x": tf.cast(boards, tf.float32), "score": scores}
+        return features, moves[:, 0] * height + moves[:, 1]
+
+    return batches.map(to_features).prefetch(1)
+
+
+def mine_input_fn(patterns=TURN_LOG_PATTERN, batch_size=BATCH_SIZE, shuffle_buffer=SHUFFLE_BUFFER, epochs=None,
+                  augment=True):
+    """Streams (features, labels) batches for mine_probability_model_fn from memory-mapped version 2 turn logs
+
+    Features hold the board, the label is the 0/1 mine layout of its game. Turns are not deduplicated: the same
+    board comes with different mines in different games, and each is a sample of the mine probabilities.
+    """
+    width, height = dataset.get_field_size(patterns)
+
+    def generator():
+        for boards, _, _, mines in dataset.iter_batches(patterns, batch_size, shuffle_buffer, epochs=epochs,
+                                                        augment_symmetries=augment, mines=True):
+            yield boards, mines
+
+    batches = tf.data.Dataset.from_generator(
+        generator,
+        output_types=(tf.int8, tf.uint8),
+        output_shapes=([batch_size, width, height], [batch_size, width, height]))
+
+    def to_features(boards, mines):
+        return {"x": boards}, tf.cast(mines, tf.float32)
+
+    return batches.map(to_features).prefetch(1)
+
+
+def get_square_logits(boards):
+    """Returns (batch, width, height) logits from a stack of 3x3 convolutions, for any field size"""
+    layer = tf.one_hot(boards + OBSERVATION_OFFSET, OBSERVATION_VALUES)
+
+    for _ in range(4):
+        layer = tf.layers.conv2d(inputs=layer, filters=64, kernel_size=[3, 3], padding="same", activation=tf.nn.relu)
+
+    return tf.squeeze(tf.layers.conv2d(inputs=layer, filters=1, kernel_size=[1, 1], padding="same"), axis=-1)
+
+
+def cnn_model_fn(features, labels, mode):
+    """Fully convolutional move model: one logit per square, softmax over the whole field
+
+    features["x"] holds (batch, width, height) observations as from train_input_fn, labels the move as a flat
+    x * height + y index.
+    """
+    boards = tf.cast(features["x"], tf.int32)
+    logits = tf.reshape(get_square_logits(boards), [tf.shape(boards)[0], -1])
+
+    predictions = {
+        "classes": tf.argmax(input=logits, axis=1),
+        "probabilities": tf.nn.softmax(logits, name="softmax_tensor"),
+    }
+
+    if mode == tf.estimator.ModeKeys.PREDICT:
+        return tf.estimator.EstimatorSpec(mode=mode, predictions=predictions)
+
+    loss = tf.losses.sparse_softmax_cross_entropy(labels=labels, logits=logits)
+
+    if mode == tf.estimator.ModeKeys.TRAIN:
+        optimizer = tf.train.AdamOptimizer(learning_rate=0.001)
+        train_op = optimizer.minimize(loss=loss, global_step=tf.train.get_global_step())
+        return tf.estimator.EstimatorSpec(mode=mode, loss=loss, train_op=train_op)
+
+    eval_metric_ops = {
+        "accuracy": tf.metrics.accuracy(labels=labels, predictions=predictions["classes"])
+    }
+    return tf.estimator.EstimatorSpec(mode=mode, loss=loss, eval_metric_ops=eval_metric_ops)
+
+
+def mine_probability_model_fn(features, labels, mode):
+    """Fully convolutional model predicting the mine probability of every square, for any field size
+
+    features["x"] holds (batch, width, height) observations, labels the matching 0/1 mine layouts as from
+    mine_input_fn. Only hidden squares contribute to the loss.
+    """
+    boards = tf.cast(features["x"], tf.int32)
+    logits = get_square_logits(boards)
+    predictions = {"probabilities": tf.sigmoid(logits, name="mine_probabilities")}
+
+    if mode == tf.estimator.ModeKeys.PREDICT:
+        return tf.estimator.EstimatorSpec(mode=mode, predictions=predictions)
+
+    hidden = tf.cast(tf.equal(boards, HIDDEN), tf.float32)
+    loss = tf.losses.sigmoid_cross_entropy(multi_class_labels=labels, logits=logits, weights=hidden)
+
+    if mode == tf.estimator.ModeKeys.TRAIN:
+        optimizer = tf.train.AdamOptimizer(learning_rate=0.001)
+        train_op = optimizer.minimize(loss=loss, global_step=tf.train.get_global_step())
+        return tf.estimator.EstimatorSpec(mode=mode, loss=loss, train_op=train_op)
+
+    eval_metric_ops = {
+        "auc": tf.metrics.auc(labels=labels, predictions=predictions["probabilities"], weights=hidden)
+    }
+    return tf.estimator.EstimatorSpec(mode=mode, loss=loss, eval_metric_ops=eval_metric_ops)
+
+
+def load_predict_fn(model_dir=MODEL_DIR):
+    """Restores mine_probability_model_fn from its latest checkpoint
+
+    Returns a function mapping a (batch, width, height) int8 array of boards to mine probabilities, meant to be
+    wrapped in a neural_service.BatchedPredictor.
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        boards = tf.placeholder(tf.int8, [None, None, None])
+        spec = mine_probability_model_fn({"x": boards}, None, tf.estimator.ModeKeys.PREDICT)
+        session = tf.Session(graph=graph)
+        tf.train.Saver().restore(session, tf.train.latest_checkpoint(model_dir))
+
+    def predict(batch):
+        return session.run(spec.predictions["probabilities"], {boards: batch})
+
+    return predict
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the move or mine probability model on binary turn logs')
+    parser.add_argument('--model', choices=['moves', 'mines'], default='moves',
+                        help='mines trains mine_probability_model_fn, the model behind neural_service.py')
+    parser.add_argument('--turn-logs', default=TURN_LOG_PATTERN,
+                        help='turn log shards of one field size, a glob pattern such as data.16x16.turns')
+    parser.add_argument('--model-dir', help='checkpoint directory, training resumes from it')
+    parser.add_argument('--steps', type=int, default=TRAIN_STEPS, help='training steps to run')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    tf.logging.set_verbosity(tf.logging.INFO)
+    if args.model == 'mines':
+        estimator = tf.estimator.Estimator(model_fn=mine_probability_model_fn, model_dir=args.model_dir or MODEL_DIR)
+        estimator.train(input_fn=lambda: mine_input_fn(args.turn_logs, args.batch_size), steps=args.steps)
+    else:
+        estimator = tf.estimator.Estimator(model_fn=cnn_model_fn, model_dir=args.model_dir or MOVE_MODEL_DIR)
+        estimator.train(input_fn=lambda: train_input_fn(args.turn_logs, args.batch_size), steps=args.steps)
+
+
+if __name__ == "__main__":
+    main()
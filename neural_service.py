@@ -0,0 +1,157 @@
+"""Batched neural move selection shared by concurrently running games
+
+Games submit their boards to one BatchedPredictor, which stacks whatever arrives within a short deadline (or
+until a batch is full) and runs a single forward pass for all of them.
+
+    python neural_service.py /tmp/minesweeper_model --games 1000 --concurrency 64
+"""
+import argparse
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+import numpy as np
+
+import benchmark
+import engine
+import metrics
+
+MAX_BATCH_SIZE = 256
+MAX_BATCH_DELAY = 0.002  # seconds the first request of a batch waits for company
+
+
+class BatchedPredictor:
+    """Collects predict requests from many threads and answers them with batched calls to predict_fn
+
+    predict_fn maps a (batch, width, height) int8 array of boards to mine probabilities of the same shape.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_delay=MAX_BATCH_DELAY):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+
+        self.batch_count = 0
+        self.prediction_count = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, board):
+        """Queues a board, returns a Future of its mine probabilities"""
+        future = Future()
+        self.requests.put((np.asarray(board, dtype=np.int8), future))
+        return future
+
+    def predict(self, board):
+        """Returns mine probabilities for a board, blocking until its batch has run"""
+        return self.submit(board).result()
+
+    def run(self):
+        """Batching loop, flushes on a full batch or when the oldest request's deadline passes"""
+        running = True
+        while running:
+            request = self.requests.get()
+            if request is None:
+                break
+
+            batch = [request]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    running = False
+                    break
+                batch.append(request)
+
+            self.flush(batch)
+
+    def flush(self, batch):
+        """Runs one forward pass per board shape in the batch and resolves the futures"""
+        by_shape = defaultdict(list)
+        for board, future in batch:
+            by_shape[board.shape].append((board, future))
+
+        for requests in by_shape.values():
+            try:
+                probabilities = self.predict_fn(np.stack([board for board, _ in requests]))
+            except Exception as error:
+                for _, future in requests:
+                    future.set_exception(error)
+                continue
+
+            for (_, future), board_probabilities in zip(requests, probabilities):
+                future.set_result(board_probabilities)
+            self.batch_count += 1
+            self.prediction_count += len(requests)
+
+    def close(self):
+        """Stops the batching thread once queued requests are answered"""
+        self.requests.put(None)
+        self.thread.join()
+
+
+def play_games(predictor, seeds, concurrency, difficulty=None):
+    """Plays one neural AI game per seed on concurrency threads sharing predictor, returns [(won, score)]"""
+    results = []
+    seeds = iter(seeds)
+    lock = threading.Lock()
+
+    def worker():
+        game = engine.Minesweeper(ai_mode='neural', predictor=predictor, difficulty=difficulty)
+        histogram = [0] * metrics.LATENCY_BUCKET_COUNT
+        while True:
+            with lock:
+                seed = next(seeds, None)
+            if seed is None:
+                return
+
+            game.new_game(seed)
+            won, score, _ = benchmark.play_game(game, histogram)
+            with lock:
+                results.append((won, score))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play neural AI games that share batched forward passes')
+    parser.add_argument('model_dir', help='checkpoint directory of neural.mine_probability_model_fn')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--difficulty', choices=sorted(engine.DIFFICULTIES), default='test')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrency', type=int, default=64, help='games played at the same time')
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-delay', type=float, default=MAX_BATCH_DELAY, help='batch deadline in seconds')
+    args = parser.parse_args()
+
+    import neural  # TensorFlow is only needed once a model is actually loaded
+
+    predictor = BatchedPredictor(neural.load_predict_fn(args.model_dir), args.batch_size, args.max_delay)
+    start = time.perf_counter()
+    results = play_games(predictor, range(args.seed, args.seed + args.games), args.concurrency,
+                         engine.DIFFICULTIES[args.difficulty])
+    elapsed = time.perf_counter() - start
+    predictor.close()
+
+    wins = sum(won for won, _ in results)
+    print('{:.1%} won, {:.1f} games/s, {:.1f} boards per forward pass'.format(
+        wins / len(results), len(results) / elapsed, predictor.prediction_count / max(predictor.batch_count, 1)))
+
+
+if __name__ == '__main__':
+    main()
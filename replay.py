@@ -0,0 +1,225 @@
+"""Compact game replays: the configuration, seed or mine bitmap and the ordered moves of every turn
+
+A replay file is a header followed by one record per game: a GAME struct, the field's mine bitmap packed eight
+boxes per byte (flat x * height + y order, as in boards.py) when the board cannot be rebuilt from the seed alone,
+then per turn a TURN struct and its (x, y) squares as uint16 pairs. Games on chunked boards (see chunked.py)
+also store their chunk size right after the GAME struct. A typical turn costs a few bytes per move.
+
+Replaying re-executes the moves headlessly at full speed or in the pygame window, and --verify checks that the
+current solver still chooses the recorded moves, turning a changed game into a reproducible test case.
+
+    python benchmark.py --games 1000 --replays games.replay
+    python replay.py games.replay --verify
+    python replay.py games.replay --ui --speed 5
+"""
+import argparse
+import os
+import struct
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+import boards
+import chunked
+import engine
+
+MAGIC = b'MSRP'
+VERSION = 1
+HEADER = struct.Struct('<4sB')  # magic, version
+GAME = struct.Struct('<HHIQ12sBBI')  # width, height, mines, seed, AI mode, flags, first click mode, turn count
+CHUNK = struct.Struct('<H')  # chunk size of a chunked board
+TURN = struct.Struct('<HH')  # reveal count, flag count, followed by (x, y) SQUARE pairs, reveals first
+SQUARE = np.dtype('<u2')
+
+# GAME flags
+BITMAP_FLAG = 1  # the packed mine bitmap follows the GAME struct
+PREGENERATED_FLAG = 2  # the bitmap was dealt by new_game, else the mines were placed by the first reveal
+CHUNKED_FLAG = 4  # the board is a chunked one, generated from the seed and the CHUNK struct that follows GAME
+
+FIRST_CLICK_MODES = (None, 'safe', 'zero')  # engine.FIRST_CLICK values by their code in GAME
+
+Replay = namedtuple('Replay', ['width', 'height', 'mines', 'seed', 'ai_mode', 'first_click', 'mine_squares',
+                               'pregenerated', 'chunk_size', 'turns'])
+
+
+def encode_game(game):
+    """Returns the replay record of a game's turns so far"""
+    flags = 0
+    bitmap = b''
+    # a board placed on the first reveal depends on RNG draws made before it, so it is stored like a dealt one
+    if game.mines_placed and (game.mine_squares is not None or game.first_click is not None):
+        flags |= BITMAP_FLAG
+        bitmap = np.packbits(game.get_mine_bitmap()).tobytes()
+        if game.mine_squares is not None:
+            flags |= PREGENERATED_FLAG
+    chunk = b''
+    if isinstance(game, chunked.ChunkedMinesweeper):
+        flags |= CHUNKED_FLAG
+        chunk = CHUNK.pack(game.chunk_size)
+
+    parts = [GAME.pack(game.width, game.height, game.mines, game.seed, game.ai_mode.encode(), flags,
+                       FIRST_CLICK_MODES.index(game.first_click), len(game.turns)), chunk, bitmap]
+    for reveals, flag_squares in game.turns:
+        parts.append(TURN.pack(len(reveals), len(flag_squares)))
+        if reveals or flag_squares:
+            parts.append(np.array(reveals + flag_squares, dtype=SQUARE).tobytes())
+    return b''.join(parts)
+
+
+class ReplayWriter:
+    """Appends game records to a replay file"""
+
+    def __init__(self, filename):
+        if os.path.exists(filename) and os.path.getsize(filename):
+            with open(filename, 'rb') as replay_file:
+                read_header(replay_file.read(HEADER.size), filename)
+            self.file = open(filename, 'ab')
+        else:
+            self.file = open(filename, 'wb')
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write_game(self, game):
+        """Appends the record of a game"""
+        self.write_records(encode_game(game))
+
+    def write_records(self, records):
+        """Appends records already encoded, e.g. by worker processes"""
+        self.file.write(records)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(data, filename):
+    """Raises ValueError unless data starts with a replay header"""
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a version {} replay file'.format(filename, VERSION))
+
+
+def read_replays(filename):
+    """Yields a Replay per game in a replay file"""
+    with open(filename, 'rb') as replay_file:
+        data = replay_file.read()
+    read_header(data, filename)
+
+    offset = HEADER.size
+    while offset < len(data):
+        width, height, mines, seed, ai_mode, flags, first_click, turn_count = GAME.unpack_from(data, offset)
+        offset += GAME.size
+
+        chunk_size = None
+        if flags & CHUNKED_FLAG:
+            chunk_size, = CHUNK.unpack_from(data, offset)
+            offset += CHUNK.size
+
+        mine_squares = None
+        if flags & BITMAP_FLAG:
+            record_size = boards.get_record_size(width, height)
+            record = np.frombuffer(data, dtype=np.uint8, count=record_size, offset=offset)
+            mine_squares = boards.get_mine_squares(record, width, height)
+            offset += record_size
+
+        turns = []
+        for _ in range(turn_count):
+            reveal_count, flag_count = TURN.unpack_from(data, offset)
+            offset += TURN.size
+            squares = np.frombuffer(data, dtype=SQUARE, count=(reveal_count + flag_count) * 2, offset=offset)
+            offset += squares.nbytes
+            squares = [tuple(square) for square in squares.reshape(-1, 2).tolist()]
+            turns.append((squares[:reveal_count], squares[reveal_count:]))
+
+        yield Replay(width, height, mines, seed, ai_mode.rstrip(b'\0').decode(), FIRST_CLICK_MODES[first_click],
+                     mine_squares, bool(flags & PREGENERATED_FLAG), chunk_size, turns)
+
+
+def replay_game(game, replay, verify=False, on_turn=None):
+    """Plays a replay's turns on game, a game of the replay's size and kind, calling on_turn(game) after each one
+
+    With verify, game's solver picks every turn from the same seed and board, and the replay stops at the first
+    turn whose reveals or flags differ from the recording. Returns the index of that turn, None if every turn matched.
+    """
+    game.first_click = replay.first_click
+    if verify:
+        # the solver's guesses draw from the game RNG, which must see the same draws as in the recorded game
+        game.new_game(replay.seed, replay.mine_squares if replay.pregenerated else None)
+    else:
+        game.new_game(replay.seed, replay.mine_squares)
+
+    for turn, (reveals, flags) in enumerate(replay.turns):
+        if verify:
+            chosen_reveals, chosen_flags = game.get_AI_input(game.available_info())
+            # the solver returns its moves from sets, so only the squares of a turn are compared, not their order
+            if (set(map(tuple, chosen_reveals)) != set(reveals)
+                    or set(map(tuple, chosen_flags)) != set(flags)):
+                return turn
+
+        game.apply_moves(reveals, flags)
+        if on_turn:
+            on_turn(game)
+
+    # a board placed on the first reveal must also come out as recorded
+    if verify and replay.mine_squares is not None:
+        if np.flatnonzero(game.get_mine_bitmap()).tolist() != replay.mine_squares:
+            return len(replay.turns)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-execute recorded Minesweeper games')
+    parser.add_argument('filename', help='replay file')
+    parser.add_argument('--verify', action='store_true', help='check that the solver reproduces the recorded moves')
+    parser.add_argument('--array-engine', action='store_true', help='use the NumPy-backed ArrayMinesweeper')
+    parser.add_argument('--ui', action='store_true', help='show the games in the pygame window')
+    parser.add_argument('--speed', type=float, default=10, help='turns per second shown with --ui')
+    args = parser.parse_args()
+
+    if args.ui:
+        import minesweeper  # pygame is only needed to show the games
+        game_class = minesweeper.ArrayMinesweeper if args.array_engine else minesweeper.Minesweeper
+    else:
+        game_class = engine.ArrayMinesweeper if args.array_engine else engine.Minesweeper
+
+    def show_turn(game):
+        """Draws the changed boxes and waits for the next turn"""
+        for event in minesweeper.pygame.event.get():
+            if event.type == minesweeper.pygame.QUIT:
+                game.terminate()
+        minesweeper.pygame.display.update(game.draw_field())
+        game.clock.tick(args.speed)
+
+    games = {}  # one game per (size, AI mode, chunk size), reused by every replay of that kind
+    replay_count = 0
+    wins = 0
+    mismatch = None
+    for index, replay in enumerate(read_replays(args.filename)):
+        key = (replay.width, replay.height, replay.mines, replay.ai_mode, replay.chunk_size)
+        if key not in games:
+            difficulty = (replay.width, replay.height, replay.mines)
+            if replay.chunk_size:
+                if args.ui:
+                    parser.error('game {} is played on a chunked board, which cannot be shown'.format(index))
+                games[key] = chunked.ChunkedMinesweeper(replay.ai_mode or None, difficulty=difficulty,
+                                                        chunk_size=replay.chunk_size)
+            elif args.ui:
+                games[key] = game_class(ui=True, ai_mode=replay.ai_mode or None, difficulty=difficulty)
+            else:
+                games[key] = game_class(ai_mode=replay.ai_mode or None, difficulty=difficulty)
+        game = games[key]
+
+        mismatch = replay_game(game, replay, args.verify, show_turn if args.ui else None)
+        replay_count += 1
+        wins += int(game.is_game_won())
+        if mismatch is not None:
+            print('game {} (seed {}): solver diverges at turn {}'.format(index, replay.seed, mismatch))
+            break
+
+    print('{} games replayed, {} won'.format(replay_count, wins))
+    if mismatch is not None:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
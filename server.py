@@ -0,0 +1,310 @@
+"""Asyncio game server hosting many concurrent headless sessions in one process
+
+Every message is a HEADER (payload length, message type) followed by its payload, all little-endian. Clients
+create sessions with a field size, mine count and seed, send batches of reveal and flag moves, and get back only
+the boxes whose observation changed, never the full board. Requests on one connection are answered in order,
+so a client can pipeline requests for many sessions without waiting for each reply.
+
+    python server.py --unix /tmp/minesweeper.sock
+    python server.py --port 8765
+"""
+import argparse
+import asyncio
+import struct
+from collections import deque
+
+import numpy as np
+
+import engine
+import metrics
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_PAYLOAD = 16 * 1024 * 1024
+MAX_FIELD_BOXES = 512 * 512  # biggest field a session may ask for, games are built inside the event loop
+MAX_IDLE_GAMES = 1024  # closed games kept per difficulty for reuse by new sessions
+MAX_IDLE_DIFFICULTIES = 64  # difficulties with closed games kept, others are dropped when closed
+
+HEADER = struct.Struct('<IB')  # payload length, message type
+CREATE = struct.Struct('<HHIq')  # width, height, mines, seed (-1 for a random one)
+SESSION = struct.Struct('<I')  # session id
+MOVES = struct.Struct('<IHH')  # session id, reveal count, flag count, followed by (x, y) SQUARE pairs
+STATE = struct.Struct('<IBI')  # session id, status, change count, followed by CHANGE records
+BOARD = struct.Struct('<IHH')  # session id, width, height, followed by the int8 observation in x-major order
+SQUARE = np.dtype('<u2')
+CHANGE = np.dtype([('x', '<u2'), ('y', '<u2'), ('value', 'i1')])  # value in the available_info encoding
+
+# requests
+CREATE_MESSAGE = 1
+MOVES_MESSAGE = 2
+BOARD_MESSAGE = 3
+CLOSE_MESSAGE = 4
+# responses
+STATE_MESSAGE = 65  # answers CREATE and MOVES
+BOARD_RESPONSE_MESSAGE = 66
+CLOSED_MESSAGE = 67
+ERROR_MESSAGE = 127  # payload is a UTF-8 description
+
+PLAYING = 0
+WON = 1
+LOST = 2
+
+
+class ProtocolError(Exception):
+    """A request the server cannot act on, reported to the client with an ERROR message"""
+
+
+def frame(message_type, payload):
+    """Returns a message ready to be written to the stream"""
+    return HEADER.pack(len(payload), message_type) + payload
+
+
+async def read_frame(reader):
+    """Returns (message type, payload) of the next message, raises IncompleteReadError at the end of the stream"""
+    length, message_type = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_PAYLOAD:
+        raise ProtocolError('Message of {} bytes is too long'.format(length))
+    return message_type, await reader.readexactly(length)
+
+
+def get_status(game):
+    """Returns PLAYING, WON or LOST"""
+    if game.mine_hit:
+        return LOST
+    if game.is_game_won():
+        return WON
+    return PLAYING
+
+
+def get_changes(game, squares):
+    """Returns CHANGE records with the current observation of the given (x, y) squares"""
+    changes = np.zeros(len(squares), dtype=CHANGE)
+    if squares:
+        coordinates = np.array(squares, dtype=np.intp)
+        changes['x'] = coordinates[:, 0]
+        changes['y'] = coordinates[:, 1]
+        changes['value'] = game.observation[coordinates[:, 0], coordinates[:, 1]]
+    return changes
+
+
+class GameServer:
+    """Sessions of every connection, each session an engine.ArrayMinesweeper without a solver"""
+
+    def __init__(self):
+        self.sessions = {}  # session id -> game
+        self.owners = {}  # session id -> connection that created it
+        self.idle_games = {}  # difficulty -> closed games ready to be reused
+        self.next_session = 1
+
+    async def handle_connection(self, reader, writer):
+        """Answers the requests of one client until it disconnects, then closes its sessions"""
+        connection = object()
+        try:
+            while True:
+                try:
+                    message_type, payload = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+
+                try:
+                    writer.write(self.handle_message(connection, message_type, payload))
+                except ProtocolError as error:
+                    writer.write(frame(ERROR_MESSAGE, str(error).encode()))
+                await writer.drain()
+        except (ConnectionError, ProtocolError):
+            pass
+        finally:
+            for session in [session for session, owner in self.owners.items() if owner is connection]:
+                self.close_session(session)
+            writer.close()
+
+    @metrics.timed('server.message')
+    def handle_message(self, connection, message_type, payload):
+        """Returns the framed response to one request"""
+        if message_type == CREATE_MESSAGE:
+            return self.create_session(connection, payload)
+
+        if len(payload) < SESSION.size:
+            raise ProtocolError('Message without a session id')
+        session, = SESSION.unpack_from(payload)
+        if self.owners.get(session) is not connection:
+            raise ProtocolError('Unknown session {}'.format(session))
+
+        if message_type == MOVES_MESSAGE:
+            return self.apply_moves(session, payload)
+        if message_type == BOARD_MESSAGE:
+            game = self.sessions[session]
+            board = np.ascontiguousarray(game.observation)
+            return frame(BOARD_RESPONSE_MESSAGE, BOARD.pack(session, game.width, game.height) + board.tobytes())
+        if message_type == CLOSE_MESSAGE:
+            self.close_session(session)
+            return frame(CLOSED_MESSAGE, SESSION.pack(session))
+        raise ProtocolError('Unknown message type {}'.format(message_type))
+
+    def create_session(self, connection, payload):
+        """Starts a game, reusing a closed one of the same size when available"""
+        if len(payload) != CREATE.size:
+            raise ProtocolError('Malformed CREATE message')
+        width, height, mines, seed = CREATE.unpack(payload)
+        if not width or not height or mines >= width * height:
+            raise ProtocolError('Invalid field {}x{} with {} mines'.format(width, height, mines))
+        if width * height > MAX_FIELD_BOXES:
+            raise ProtocolError('Field {}x{} is bigger than {} boxes'.format(width, height, MAX_FIELD_BOXES))
+
+        difficulty = (width, height, mines)
+        idle_games = self.idle_games.get(difficulty)
+        if idle_games:
+            game = idle_games.pop()
+            if not idle_games:
+                del self.idle_games[difficulty]
+        else:
+            game = engine.ArrayMinesweeper(ai_mode='simple', difficulty=difficulty)
+        game.new_game(None if seed < 0 else seed)
+
+        session = self.next_session
+        self.next_session += 1
+        self.sessions[session] = game
+        self.owners[session] = connection
+        metrics.count('server.sessions')
+        return frame(STATE_MESSAGE, STATE.pack(session, PLAYING, 0))
+
+    def apply_moves(self, session, payload):
+        """Applies a batch of moves, returns the state with the boxes whose observation changed"""
+        game = self.sessions[session]
+        if get_status(game) != PLAYING:
+            raise ProtocolError('Session {} is over'.format(session))
+
+        if len(payload) < MOVES.size:
+            raise ProtocolError('Malformed MOVES message')
+        _, reveal_count, flag_count = MOVES.unpack_from(payload)
+        if len(payload) != MOVES.size + (reveal_count + flag_count) * 2 * SQUARE.itemsize:
+            raise ProtocolError('Malformed MOVES message')
+        squares = np.frombuffer(payload, dtype=SQUARE, offset=MOVES.size).reshape(-1, 2)
+        if len(squares) and ((squares[:, 0] >= game.width).any() or (squares[:, 1] >= game.height).any()):
+            raise ProtocolError('Move outside the {}x{} field'.format(game.width, game.height))
+
+        squares = squares.tolist()
+        result = game.apply_moves(squares[:reveal_count], squares[reveal_count:])
+
+        changed = dict.fromkeys(game.changed_squares)
+        game.changed_squares = []
+        if result.mine_hit:
+            # the lost game shows every mine, see show_mines
+            changed.update(dict.fromkeys(map(tuple, np.argwhere(game.mine_field == engine.MINE_VALUE).tolist())))
+        changes = get_changes(game, list(changed))
+
+        metrics.count('server.moves', reveal_count + flag_count)
+        return frame(STATE_MESSAGE, STATE.pack(session, get_status(game), len(changes)) + changes.tobytes())
+
+    def close_session(self, session):
+        """Forgets a session, keeping its game for reuse unless too many games or difficulties are kept"""
+        game = self.sessions.pop(session)
+        del self.owners[session]
+        difficulty = (game.width, game.height, game.mines)
+        if difficulty not in self.idle_games and len(self.idle_games) >= MAX_IDLE_DIFFICULTIES:
+            return
+        idle_games = self.idle_games.setdefault(difficulty, [])
+        if len(idle_games) < MAX_IDLE_GAMES:
+            idle_games.append(game)
+
+
+async def serve(unix_path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Runs a GameServer on a Unix socket if unix_path is given, else on TCP host:port, until cancelled"""
+    game_server = GameServer()
+    if unix_path:
+        server = await asyncio.start_unix_server(game_server.handle_connection, unix_path)
+    else:
+        server = await asyncio.start_server(game_server.handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+class GameClient:
+    """Pipelined client of one connection, any number of requests can be in flight at once
+
+    Replies arrive in request order, so every request queues a future that the reader task resolves in turn.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = deque()
+        self.reader_task = asyncio.ensure_future(self.read_responses())
+
+    @classmethod
+    async def connect(cls, unix_path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Returns a client connected to a Unix socket if unix_path is given, else to TCP host:port"""
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def read_responses(self):
+        """Resolves pending requests with (message type, payload) as their replies arrive"""
+        try:
+            while True:
+                response = await read_frame(self.reader)
+                self.pending.popleft().set_result(response)
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as error:
+            while self.pending:
+                self.pending.popleft().set_exception(ConnectionError('Connection closed: {!r}'.format(error)))
+
+    async def request(self, message_type, payload, expected_type):
+        """Sends one request and returns the payload of its reply"""
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(frame(message_type, payload))
+        await self.writer.drain()
+
+        response_type, response = await future
+        if response_type == ERROR_MESSAGE:
+            raise ProtocolError(response.decode())
+        if response_type != expected_type:
+            raise ProtocolError('Expected message type {}, got {}'.format(expected_type, response_type))
+        return response
+
+    async def create(self, difficulty, seed=None):
+        """Starts a game on a (width, height, mines) field, returns its session id"""
+        width, height, mines = difficulty
+        response = await self.request(CREATE_MESSAGE, CREATE.pack(width, height, mines, -1 if seed is None else seed),
+                                      STATE_MESSAGE)
+        session, _, _ = STATE.unpack_from(response)
+        return session
+
+    async def moves(self, session, reveals=(), flags=()):
+        """Applies a batch of moves, returns (status, CHANGE records of the boxes that changed)"""
+        squares = np.array(list(reveals) + list(flags), dtype=SQUARE).reshape(-1, 2)
+        payload = MOVES.pack(session, len(reveals), len(flags)) + squares.tobytes()
+        response = await self.request(MOVES_MESSAGE, payload, STATE_MESSAGE)
+        _, status, _ = STATE.unpack_from(response)
+        return status, np.frombuffer(response, dtype=CHANGE, offset=STATE.size)
+
+    async def board(self, session):
+        """Returns the full (width, height) int8 observation of a session"""
+        response = await self.request(BOARD_MESSAGE, SESSION.pack(session), BOARD_RESPONSE_MESSAGE)
+        _, width, height = BOARD.unpack_from(response)
+        return np.frombuffer(response, dtype=np.int8, offset=BOARD.size).reshape(width, height)
+
+    async def close_session(self, session):
+        """Ends a session"""
+        await self.request(CLOSE_MESSAGE, SESSION.pack(session), CLOSED_MESSAGE)
+
+    async def close(self):
+        """Closes the connection, the server closes every session still open on it"""
+        self.writer.close()
+        await self.reader_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Host headless Minesweeper sessions for external clients')
+    parser.add_argument('--unix', default=None, help='Unix socket path (default: TCP)')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.unix, args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,672 @@
+"""Minesweeper AIs, one solver per game, fed the boxes that changed since the last turn
+
+Solvers only read the game's available_info, counters, neighbour table and RNG, see engine.Minesweeper.get_AI_input.
+"""
+import random
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+import metrics
+from engine import FLAGGED, HIDDEN, MINE, MINE_VALUE
+
+try:
+    from math import comb
+except ImportError:  # Python 3.7, the newest the pinned pygame and TensorFlow support
+    def comb(n, k):
+        """Returns the number of ways to choose k items from n"""
+        if not 0 <= k <= n:
+            return 0
+        k = min(k, n - k)
+        result = 1
+        for i in range(1, k + 1):
+            result = result * (n - k + i) // i
+        return result
+
+MAX_SUBSET_ROUNDS = 8  # bounds how many times derived constraints are fed back into the subset rule
+MAX_COMPONENT_CONSTRAINTS = 2000  # stop deriving constraints for a component beyond this many
+MAX_EXACT_COMPONENT_SIZE = 24  # components with more squares are sampled instead of enumerated
+PROBABILITY_SAMPLES = 400  # configurations sampled per oversized component
+SAMPLE_NODE_BUDGET = 5000  # search steps allowed per sampled configuration
+COMPONENT_CACHE_SIZE = 4096  # enumerated components kept in the LRU cache, shared across turns and games
+PATTERN_RADIUS = 2  # pattern windows span the numbers around a frontier square and all of their neighbours
+PATTERN_CACHE_SIZE = 65536  # window deductions kept in the LRU cache, shared across turns and games
+INTERIOR_SAMPLES = 64  # random squares tried when guessing in the interior before listing all of it
+BULK_UPDATE_SQUARES = 64  # changed squares from which update looks up their neighbours in one NumPy pass
+
+
+class FrontierSolver:
+    """Count-rule AI that keeps a frontier of revealed numbers and only re-evaluates the ones around changed boxes
+
+    A number's deductions depend only on its neighbourhood, so a number that yielded nothing stays settled
+    until one of its neighbours is revealed or flagged.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.neighbours = game.neighbours
+        self.frontier = set()  # revealed numbers that still have uncertain neighbours
+        self.dirty = set()  # squares whose neighbourhood changed since they were last evaluated
+
+    def reset(self):
+        """Forgets everything about the previous game"""
+        self.frontier.clear()
+        self.dirty.clear()
+
+    def update(self, changed_squares):
+        """Marks changed squares and their neighbours for re-evaluation"""
+        if len(changed_squares) > BULK_UPDATE_SQUARES:
+            self.dirty |= self.neighbours.get_neighbourhood(changed_squares)
+            return
+        for x, y in changed_squares:
+            self.dirty.add((x, y))
+            self.dirty.update(self.neighbours.get_squares(x, y))
+
+    def evaluate(self, info, square):
+        """Returns (uncertain neighbours, mines left) of a revealed number, updating its frontier membership"""
+        x, y = square
+        value = info[x][y]
+        if value in (HIDDEN, FLAGGED, MINE, MINE_VALUE):
+            self.frontier.discard(square)
+            return [], 0
+
+        uncertain = []
+        flagged_count = 0
+        for i, j in self.neighbours.get_squares(x, y):
+            if info[i][j] == HIDDEN:
+                uncertain.append((i, j))
+            elif info[i][j] == FLAGGED:
+                flagged_count += 1
+
+        if uncertain:
+            self.frontier.add(square)
+        else:
+            self.frontier.discard(square)
+        return uncertain, value - flagged_count
+
+    @metrics.timed('solver.count_rule')
+    def get_count_rule_squares(self, info):
+        """Applies the count rule to dirty frontier squares, returns (safe squares, mine squares)"""
+        revealed_squares = set()
+        flagged_squares = set()
+
+        for square in self.dirty:
+            uncertain, mines_left = self.evaluate(info, square)
+            if not uncertain:
+                continue
+            if mines_left == 0:
+                revealed_squares.update(uncertain)
+            elif mines_left == len(uncertain):
+                flagged_squares.update(uncertain)
+        self.dirty.clear()
+
+        return revealed_squares, flagged_squares
+
+    def get_certain_squares(self, info):
+        """Returns (safe squares, mine squares) that can be deduced from the board"""
+        return self.get_count_rule_squares(info)
+
+    def get_guess(self, info):
+        """Returns a random uncertain square to reveal when nothing is certain"""
+        rng = self.game.rng
+        width, height = self.game.width, self.game.height
+        for _ in range(width * height):
+            x, y = rng.randrange(width), rng.randrange(height)
+            if info[x][y] == HIDDEN:
+                return x, y
+
+        uncertain = [(x, y) for x in range(width) for y in range(height) if info[x][y] == HIDDEN]
+        if uncertain:
+            return rng.choice(uncertain)
+        return rng.randrange(width), rng.randrange(height)
+
+    def get_AI_input(self, info, changed_squares):
+        """Returns both the safe squares and the flagged squares"""
+        self.update(changed_squares)
+        revealed_squares, flagged_squares = self.get_certain_squares(info)
+
+        if not revealed_squares and not flagged_squares:
+            metrics.count('guesses')
+            with metrics.timer('solver.guess'):
+                revealed_squares.add(self.get_guess(info))
+
+        return list(revealed_squares), list(flagged_squares)
+
+
+class ConstraintSolver(FrontierSolver):
+    """Frontier solver that falls back to subset reduction when the count rule is stuck
+
+    Every frontier number is a constraint "these uncertain squares hold this many mines". If the squares of one
+    constraint are a subset of another's, the difference holds the difference of their counts, which may prove it
+    all safe or all mines. Constraints are split into components that share no squares and reduced separately.
+    """
+
+    def __init__(self, game):
+        super().__init__(game)
+        self.constraints = {}  # frontier square -> (frozenset of uncertain squares, mines left)
+        self.pattern_dirty = set()  # squares whose pattern window changed since it was last looked up
+
+    def reset(self):
+        """Forgets everything about the previous game"""
+        super().reset()
+        self.constraints.clear()
+        self.pattern_dirty.clear()
+
+    def evaluate(self, info, square):
+        """Returns (uncertain neighbours, mines left) of a revealed number, keeping its constraint up to date"""
+        uncertain, mines_left = super().evaluate(info, square)
+        if uncertain:
+            self.constraints[square] = (frozenset(uncertain), mines_left)
+        else:
+            self.constraints.pop(square, None)
+        return uncertain, mines_left
+
+    def get_components(self):
+        """Splits the frontier constraints into groups that share no uncertain squares"""
+        parent = {}
+
+        def find(square):
+            while parent[square] != square:
+                parent[square] = parent[parent[square]]
+                square = parent[square]
+            return square
+
+        for squares, _ in self.constraints.values():
+            for square in squares:
+                parent.setdefault(square, square)
+            root = find(next(iter(squares)))
+            for square in squares:
+                parent[find(square)] = root
+
+        components = defaultdict(set)
+        for constraint in self.constraints.values():
+            components[find(next(iter(constraint[0])))].add(constraint)
+        return list(components.values())
+
+    def reduce_component(self, constraints):
+        """Applies the subset rule within one component, returns (safe squares, mine squares)"""
+        revealed_squares = set()
+        flagged_squares = set()
+        constraints = set(constraints)
+
+        for _ in range(MAX_SUBSET_ROUNDS):
+            containing = defaultdict(list)
+            for constraint in constraints:
+                for square in constraint[0]:
+                    containing[square].append(constraint)
+
+            derived = set()
+            for squares, mines in constraints:
+                supersets = set(containing[next(iter(squares))])
+                for square in squares:
+                    supersets.intersection_update(containing[square])
+
+                for superset_squares, superset_mines in supersets:
+                    if squares < superset_squares:
+                        difference = (superset_squares - squares, superset_mines - mines)
+                        if difference not in constraints:
+                            derived.add(difference)
+
+            for squares, mines in derived:
+                if mines == 0:
+                    revealed_squares.update(squares)
+                elif mines == len(squares):
+                    flagged_squares.update(squares)
+
+            if revealed_squares or flagged_squares or not derived:
+                break
+            constraints |= derived
+            if len(constraints) > MAX_COMPONENT_CONSTRAINTS:
+                break
+
+        return revealed_squares, flagged_squares
+
+    @metrics.timed('solver.subset_rule')
+    def get_subset_rule_squares(self):
+        """Reduces each frontier component separately, returns (safe squares, mine squares)"""
+        revealed_squares = set()
+        flagged_squares = set()
+
+        for component in self.get_components():
+            safe, mines = self.reduce_component(component)
+            revealed_squares |= safe
+            flagged_squares |= mines
+
+        return revealed_squares, flagged_squares
+
+    def update(self, changed_squares):
+        """Marks changed squares and their neighbours for re-evaluation, and the pattern windows they fall in"""
+        super().update(changed_squares)
+        width, height = self.game.width, self.game.height
+        for x, y in changed_squares:
+            for i in range(max(x - PATTERN_RADIUS, 0), min(x + PATTERN_RADIUS + 1, width)):
+                for j in range(max(y - PATTERN_RADIUS, 0), min(y + PATTERN_RADIUS + 1, height)):
+                    self.pattern_dirty.add((i, j))
+
+    @metrics.timed('solver.pattern_rule')
+    def get_pattern_rule_squares(self, info):
+        """Looks up the deductions of the window around every frontier square whose window changed
+
+        Returns (safe squares, mine squares). Windows are keyed by their Zobrist hash in PATTERN_CACHE and only
+        solved on a miss, see get_pattern_deductions.
+        """
+        revealed_squares = set()
+        flagged_squares = set()
+        width, height = self.game.width, self.game.height
+
+        for x, y in self.pattern_dirty & self.frontier:
+            key = get_pattern_key(info, x, y, width, height)
+            with PATTERN_CACHE_LOCK:
+                deductions = PATTERN_CACHE.get(key)
+                if deductions is not None:
+                    PATTERN_CACHE.move_to_end(key)
+
+            if deductions is None:
+                metrics.count('solver.pattern_misses')
+                deductions = get_pattern_deductions(info, x, y, width, height)
+                with PATTERN_CACHE_LOCK:
+                    PATTERN_CACHE[key] = deductions
+                    if len(PATTERN_CACHE) > PATTERN_CACHE_SIZE:
+                        PATTERN_CACHE.popitem(last=False)
+            else:
+                metrics.count('solver.pattern_hits')
+            safe_offsets, mine_offsets = deductions
+
+            revealed_squares.update((x + i, y + j) for i, j in safe_offsets)
+            flagged_squares.update((x + i, y + j) for i, j in mine_offsets)
+        self.pattern_dirty.clear()
+
+        return revealed_squares, flagged_squares
+
+    def get_certain_squares(self, info):
+        """Returns (safe squares, mine squares) from the first of the count, pattern and subset rules to find any"""
+        revealed_squares, flagged_squares = self.get_count_rule_squares(info)
+        # only frontier windows are looked up, and a square can only rejoin the frontier through update, so this
+        # keeps pattern_dirty the size of the frontier over a run of turns the count rule settles on its own
+        self.pattern_dirty &= self.frontier
+        if not revealed_squares and not flagged_squares:
+            revealed_squares, flagged_squares = self.get_pattern_rule_squares(info)
+        if not revealed_squares and not flagged_squares:
+            revealed_squares, flagged_squares = self.get_subset_rule_squares()
+        return revealed_squares, flagged_squares
+
+
+# Zobrist hash of a pattern window: one random 64-bit number per (window position, box state), XOR-ed together
+PATTERN_OFFSETS = [
+    (i, j)
+    for i in range(-PATTERN_RADIUS, PATTERN_RADIUS + 1)
+    for j in range(-PATTERN_RADIUS, PATTERN_RADIUS + 1)
+]
+OFF_BOARD = MINE_VALUE - FLAGGED + 1  # state past the available_info values shifted by -FLAGGED
+_zobrist_rng = random.Random(0)
+PATTERN_ZOBRIST = [[_zobrist_rng.getrandbits(64) for _ in range(OFF_BOARD + 1)] for _ in PATTERN_OFFSETS]
+
+# pattern window hash -> (safe offsets, mine offsets) relative to the window center, see get_pattern_deductions
+PATTERN_CACHE = OrderedDict()
+PATTERN_CACHE_LOCK = threading.Lock()  # games on several threads share the cache, see neural_service.py
+PATTERN_RECORD_DTYPE = np.dtype([('key', '<u8'), ('safe', '<u4'), ('mines', '<u4')])  # offsets as bit masks
+
+
+def get_pattern_key(info, x, y, width, height):
+    """Returns the Zobrist hash of the window around (x, y)"""
+    key = 0
+    for (i, j), zobrist in zip(PATTERN_OFFSETS, PATTERN_ZOBRIST):
+        u, v = x + i, y + j
+        if 0 <= u < width and 0 <= v < height:
+            key ^= zobrist[info[u][v] - FLAGGED]
+        else:
+            key ^= zobrist[OFF_BOARD]
+    return key
+
+
+def get_pattern_deductions(info, x, y, width, height):
+    """Returns (safe offsets, mine offsets) proven by the numbers next to (x, y) alone
+
+    Their uncertain neighbours all lie in the window, so every configuration of them is enumerated; a square
+    that is empty or a mine in all of them is certain whatever the rest of the board holds.
+    """
+    constraints = []
+    for i in range(max(x - 1, 0), min(x + 2, width)):
+        for j in range(max(y - 1, 0), min(y + 2, height)):
+            value = info[i][j]
+            if value in (HIDDEN, FLAGGED, MINE, MINE_VALUE):
+                continue
+
+            uncertain = []
+            flagged_count = 0
+            for u in range(max(i - 1, 0), min(i + 2, width)):
+                for v in range(max(j - 1, 0), min(j + 2, height)):
+                    if info[u][v] == HIDDEN:
+                        uncertain.append((u, v))
+                    elif info[u][v] == FLAGGED:
+                        flagged_count += 1
+            if uncertain:
+                constraints.append((frozenset(uncertain), value - flagged_count))
+
+    if not constraints:
+        return (), ()
+    squares, signature = get_component_signature(constraints)
+    distribution = enumerate_component(signature, len(squares))
+    if not distribution:
+        return (), ()
+
+    total = sum(count for count, _ in distribution.values())
+    mine_counts = [sum(square_counts) for square_counts in zip(*[counts for _, counts in distribution.values()])]
+    safe_offsets = tuple((u - x, v - y) for (u, v), count in zip(squares, mine_counts) if count == 0)
+    mine_offsets = tuple((u - x, v - y) for (u, v), count in zip(squares, mine_counts) if count == total)
+    return safe_offsets, mine_offsets
+
+
+def get_pattern_records():
+    """Returns PATTERN_CACHE as an array of PATTERN_RECORD_DTYPE records, least recently used first"""
+    index = {offset: i for i, offset in enumerate(PATTERN_OFFSETS)}
+    with PATTERN_CACHE_LOCK:
+        patterns = list(PATTERN_CACHE.items())
+    records = np.zeros(len(patterns), dtype=PATTERN_RECORD_DTYPE)
+    for record, (key, (safe_offsets, mine_offsets)) in zip(records, patterns):
+        record['key'] = key
+        record['safe'] = sum(1 << index[offset] for offset in safe_offsets)
+        record['mines'] = sum(1 << index[offset] for offset in mine_offsets)
+    return records
+
+
+def add_pattern_records(records):
+    """Adds records from get_pattern_records to PATTERN_CACHE as most recently used"""
+    patterns = [
+        (key, (tuple(offset for i, offset in enumerate(PATTERN_OFFSETS) if safe >> i & 1),
+               tuple(offset for i, offset in enumerate(PATTERN_OFFSETS) if mines >> i & 1)))
+        for key, safe, mines in records.tolist()
+    ]
+    with PATTERN_CACHE_LOCK:
+        for key, deductions in patterns:
+            PATTERN_CACHE[key] = deductions
+            PATTERN_CACHE.move_to_end(key)
+        while len(PATTERN_CACHE) > PATTERN_CACHE_SIZE:
+            PATTERN_CACHE.popitem(last=False)
+
+
+def save_pattern_cache(filename, records=None):
+    """Writes PATTERN_CACHE, or the given records, to a NumPy file"""
+    with open(filename, 'wb') as cache_file:
+        np.save(cache_file, get_pattern_records() if records is None else records)
+
+
+def load_pattern_cache(filename):
+    """Adds the patterns of a file written by save_pattern_cache to PATTERN_CACHE"""
+    add_pattern_records(np.load(filename))
+
+
+# canonical component signature -> configuration counts, see enumerate_component
+COMPONENT_CACHE = OrderedDict()
+COMPONENT_CACHE_LOCK = threading.Lock()
+
+
+def get_component_signature(constraints):
+    """Returns (squares, signature) of a component, the signature numbers squares by their sorted order
+
+    Sorting is translation invariant, so the same local pattern gets the same signature anywhere on any board.
+    """
+    squares = sorted(set().union(*[constraint[0] for constraint in constraints]))
+    index = {square: i for i, square in enumerate(squares)}
+    signature = tuple(sorted(
+        (tuple(sorted(index[square] for square in constraint_squares)), mines)
+        for constraint_squares, mines in constraints
+    ))
+    return squares, signature
+
+
+def get_square_constraints(signature, square_count):
+    """Returns, for each square of a signature, the indices of the constraints it belongs to"""
+    square_constraints = [[] for _ in range(square_count)]
+    for c, (squares, _) in enumerate(signature):
+        for square in squares:
+            square_constraints[square].append(c)
+    return square_constraints
+
+
+def enumerate_component(signature, square_count):
+    """Counts every mine configuration consistent with a component signature
+
+    Returns {mine count: (configurations, per square configurations with a mine there)}.
+    """
+    square_constraints = get_square_constraints(signature, square_count)
+    needed = [mines for _, mines in signature]
+    unassigned = [len(squares) for squares, _ in signature]
+    assignment = [0] * square_count
+    distribution = {}
+
+    def backtrack(i, mines):
+        if i == square_count:
+            count, square_counts = distribution.get(mines, (0, [0] * square_count))
+            distribution[mines] = (count + 1, [total + value for total, value in zip(square_counts, assignment)])
+            return
+
+        for value in (0, 1):
+            if all(0 <= needed[c] - value <= unassigned[c] - 1 for c in square_constraints[i]):
+                for c in square_constraints[i]:
+                    needed[c] -= value
+                    unassigned[c] -= 1
+                assignment[i] = value
+                backtrack(i + 1, mines + value)
+                for c in square_constraints[i]:
+                    needed[c] += value
+                    unassigned[c] += 1
+        assignment[i] = 0
+
+    backtrack(0, 0)
+    return distribution
+
+
+def sample_configuration(signature, square_constraints, square_count, rng):
+    """Returns one random 0/1 assignment satisfying every constraint, None if SAMPLE_NODE_BUDGET runs out
+
+    Depth-first search trying the values of each square in a random order, kept on an explicit stack since
+    sampled components are the big ones: depth is the component size.
+    """
+    needed = [mines for _, mines in signature]
+    unassigned = [len(squares) for squares, _ in signature]
+    assignment = [0] * square_count
+    orders = [None] * square_count  # value order drawn when the search entered each square
+    tried = [0] * square_count  # values of orders[i] tried so far
+    budget = SAMPLE_NODE_BUDGET
+
+    i = 0
+    entering = True
+    while True:
+        if entering:
+            if i == square_count:
+                return assignment
+            budget -= 1
+            if budget < 0:
+                return None
+            orders[i] = (0, 1) if rng.random() < 0.5 else (1, 0)
+            tried[i] = 0
+        else:
+            # back from a dead end below: undo the value tried on square i
+            for c in square_constraints[i]:
+                needed[c] += assignment[i]
+                unassigned[c] += 1
+
+        entering = False
+        while tried[i] < 2:
+            value = orders[i][tried[i]]
+            tried[i] += 1
+            if all(0 <= needed[c] - value <= unassigned[c] - 1 for c in square_constraints[i]):
+                for c in square_constraints[i]:
+                    needed[c] -= value
+                    unassigned[c] -= 1
+                assignment[i] = value
+                entering = True
+                break
+
+        if entering:
+            i += 1
+        else:
+            assignment[i] = 0
+            if not i:
+                return None
+            i -= 1
+
+
+def sample_component(signature, square_count, rng):
+    """Approximates enumerate_component with randomized searches, one configuration per successful search"""
+    square_constraints = get_square_constraints(signature, square_count)
+    distribution = {}
+
+    for _ in range(PROBABILITY_SAMPLES):
+        assignment = sample_configuration(signature, square_constraints, square_count, rng)
+        if assignment is not None:
+            mines = sum(assignment)
+            count, square_counts = distribution.get(mines, (0, [0] * square_count))
+            distribution[mines] = (count + 1, [total + value for total, value in zip(square_counts, assignment)])
+
+    return distribution
+
+
+def get_component_distribution(constraints, rng):
+    """Returns (squares, distribution) for a component, enumerated through the LRU cache or sampled if too big"""
+    squares, signature = get_component_signature(constraints)
+
+    if len(squares) > MAX_EXACT_COMPONENT_SIZE:
+        return squares, sample_component(signature, len(squares), rng)
+
+    with COMPONENT_CACHE_LOCK:
+        distribution = COMPONENT_CACHE.get(signature)
+        if distribution is not None:
+            COMPONENT_CACHE.move_to_end(signature)
+            return squares, distribution
+
+    distribution = enumerate_component(signature, len(squares))
+    with COMPONENT_CACHE_LOCK:
+        COMPONENT_CACHE[signature] = distribution
+        if len(COMPONENT_CACHE) > COMPONENT_CACHE_SIZE:
+            COMPONENT_CACHE.popitem(last=False)
+    return squares, distribution
+
+
+def convolve(first, second):
+    """Combines two {mine count: configurations} distributions of independent square groups"""
+    result = defaultdict(int)
+    for first_mines, first_count in first.items():
+        for second_mines, second_count in second.items():
+            result[first_mines + second_mines] += first_count * second_count
+    return result
+
+
+class ProbabilitySolver(ConstraintSolver):
+    """Constraint solver that guesses the square with the lowest exact mine probability
+
+    Each frontier component is enumerated separately, then components are combined with the squares no number
+    touches (the interior), weighting every total by the ways the remaining mines can be spread over the interior.
+    """
+
+    def get_probabilities(self, distributions, interior_count, mines_left):
+        """Returns ({square: mine probability}, interior mine probability) or (None, None) if inconsistent"""
+        totals = [{mines: count for mines, (count, _) in distribution.items()} for _, distribution in distributions]
+
+        def interior_ways(mines):
+            if 0 <= mines_left - mines <= interior_count:
+                return comb(interior_count, mines_left - mines)
+            return 0
+
+        everything = {0: 1}
+        for total in totals:
+            everything = convolve(everything, total)
+
+        weight = sum(count * interior_ways(mines) for mines, count in everything.items())
+        if not weight:
+            return None, None
+
+        probabilities = {}
+        for c, (squares, distribution) in enumerate(distributions):
+            others = {0: 1}
+            for other, total in enumerate(totals):
+                if other != c:
+                    others = convolve(others, total)
+
+            mine_weights = [0] * len(squares)
+            for mines, (_, square_counts) in distribution.items():
+                factor = sum(count * interior_ways(mines + other_mines) for other_mines, count in others.items())
+                for i, square_count in enumerate(square_counts):
+                    mine_weights[i] += square_count * factor
+
+            for square, mine_weight in zip(squares, mine_weights):
+                probabilities[square] = mine_weight / weight
+
+        interior_probability = None
+        if interior_count:
+            interior_mines = sum(count * interior_ways(mines) * (mines_left - mines) for mines, count in everything.items())
+            interior_probability = interior_mines / weight / interior_count
+
+        return probabilities, interior_probability
+
+    def get_guess(self, info):
+        """Returns the uncertain square least likely to hold a mine"""
+        frontier_squares = set()
+        distributions = []
+        for component in self.get_components():
+            squares, distribution = get_component_distribution(component, self.game.rng)
+            frontier_squares.update(squares)
+            # a component no sample could solve is left out, its squares are neither candidates nor interior
+            if distribution:
+                distributions.append((squares, distribution))
+
+        # counted from the game's counters, a scan of the whole board would dominate on huge boards
+        game = self.game
+        interior_count = game.width * game.height - game.revealed_count - game.flag_count - len(frontier_squares)
+
+        probabilities, interior_probability = self.get_probabilities(
+            distributions, interior_count, game.mines - game.flag_count)
+        if probabilities is None:
+            return super().get_guess(info)
+
+        if probabilities:
+            square = min(probabilities, key=probabilities.get)
+            if interior_probability is None or probabilities[square] <= interior_probability:
+                return square
+        return self.get_interior_square(info, frontier_squares) or super().get_guess(info)
+
+    def get_interior_square(self, info, frontier_squares):
+        """Returns a random hidden square that no number touches, None if there is none"""
+        rng = self.game.rng
+        width, height = self.game.width, self.game.height
+        for _ in range(INTERIOR_SAMPLES):
+            x, y = rng.randrange(width), rng.randrange(height)
+            if info[x][y] == HIDDEN and (x, y) not in frontier_squares:
+                return x, y
+
+        interior = [(x, y) for x in range(width) for y in range(height)
+                    if info[x][y] == HIDDEN and (x, y) not in frontier_squares]
+        return rng.choice(interior) if interior else None
+
+
+class NeuralSolver(ConstraintSolver):
+    """Constraint solver that guesses the hidden square a network rates least likely to hold a mine
+
+    Predictions go through game.predictor, usually a neural_service.BatchedPredictor shared by many games.
+    """
+
+    def __init__(self, game):
+        if game.predictor is None:
+            raise ValueError('The neural AI needs a predictor')
+        super().__init__(game)
+
+    def get_guess(self, info):
+        """Returns the hidden square with the lowest predicted mine probability"""
+        board = np.asarray(info, dtype=np.int8)
+        hidden = board == HIDDEN
+        if not hidden.any():
+            return super().get_guess(info)
+
+        probabilities = np.where(hidden, self.game.predictor.predict(board), np.inf)
+        x, y = np.unravel_index(np.argmin(probabilities), probabilities.shape)
+        return int(x), int(y)
+
+
+SOLVERS = {
+    'frontier': FrontierSolver,
+    'constraint': ConstraintSolver,
+    'probability': ProbabilitySolver,
+    'neural': NeuralSolver,
+}
@@ -0,0 +1,52 @@
+"""Checks of the lockstep batch simulator against the array engine
+
+    python -m pytest -q
+"""
+import random
+
+import numpy as np
+
+import batch
+import engine
+from engine import MINE_VALUE
+
+
+def test_batch_matches_array_engine():
+    width, height, mines = engine.INTERMEDIATE
+    games = batch.BatchMinesweeper(16, width, height, mines, seed=0, auto_reset=False)
+    local_games = []
+    for i in range(games.batch_size):
+        local_game = engine.ArrayMinesweeper(difficulty=engine.INTERMEDIATE)
+        local_game.new_game(i, np.flatnonzero(games.mine_fields[i] == MINE_VALUE).tolist())
+        local_games.append(local_game)
+
+    rng = random.Random(0)
+    last_moves = [(0, 0)] * games.batch_size
+    while not all(game.mine_hit or game.is_game_won() for game in local_games):
+        moves = []
+        flags = []
+        for i, local_game in enumerate(local_games):
+            if local_game.mine_hit or local_game.is_game_won():
+                # flagging a revealed box does nothing in either engine
+                moves.append(last_moves[i])
+                flags.append(True)
+                continue
+
+            # only mines are flagged, so flags never sit where a flood fill goes
+            hidden = np.argwhere(~local_game.revealed_boxes & ~local_game.flagged_mines).tolist()
+            hidden_mines = [square for square in hidden if local_game.is_there_mine(local_game.mine_field, *square)]
+            flag = hidden_mines and rng.random() < 0.2
+            square = tuple(rng.choice(hidden_mines if flag else hidden))
+            if flag:
+                local_game.apply_moves(flags=[square])
+            else:
+                local_game.apply_moves([square])
+                last_moves[i] = square
+            moves.append(square)
+            flags.append(bool(flag))
+
+        info, won, lost, _ = games.step(np.array(moves), np.array(flags))
+        for i, local_game in enumerate(local_games):
+            assert (info[i] == local_game.available_info()).all(), i
+            if not flags[i]:
+                assert won[i] == local_game.is_game_won() and lost[i] == local_game.mine_hit, i
@@ -0,0 +1,37 @@
+"""Checks of chunked boards against dense boards with the same mines
+
+    python -m pytest -q
+"""
+import numpy as np
+import pytest
+
+import chunked
+import engine
+from engine import MINE_VALUE
+
+SEEDS = range(20)
+
+
+@pytest.mark.parametrize('memory_budget', [chunked.MEMORY_BUDGET, 200])
+def test_chunked_board_matches_dense_board(memory_budget):
+    difficulty = (37, 29, 150)
+    game = chunked.ChunkedMinesweeper('constraint', difficulty=difficulty, chunk_size=8, memory_budget=memory_budget)
+    dense_game = engine.ArrayMinesweeper(difficulty=difficulty)
+    for seed in SEEDS:
+        game.new_game(seed)
+        field = np.array([[game.mine_field[x][y] for y in range(game.height)] for x in range(game.width)])
+        assert np.count_nonzero(field == MINE_VALUE) == game.mines
+        dense_game.new_game(seed, np.flatnonzero(field == MINE_VALUE).tolist())
+        assert (field == dense_game.mine_field).all(), seed
+
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            reveals, flags = game.get_AI_input(game.available_info())
+            assert game.apply_moves(reveals, flags) == dense_game.apply_moves(reveals, flags)
+        observation = np.array([[game.observation[x][y] for y in range(game.height)] for x in range(game.width)])
+        dense_observation = dense_game.available_info()
+        if game.mine_hit:
+            # a lost chunked game only shows the mines of the chunks it revealed boxes in
+            untouched = (observation == engine.HIDDEN) & (dense_observation == MINE_VALUE)
+            dense_observation = np.where(untouched, engine.HIDDEN, dense_observation)
+        assert (observation == dense_observation).all(), seed
@@ -0,0 +1,82 @@
+"""Checks of the streaming turn log reader
+
+    python -m pytest -q
+"""
+import numpy as np
+import pytest
+
+import dataset
+import engine
+import turnlog
+
+
+def write_logs(monkeypatch, directory, difficulty, seeds):
+    """Logs the AI's games on seeded boards to directory, returns the shard filename"""
+    monkeypatch.setattr(engine, 'LOG_TO_FILE', True)
+    monkeypatch.chdir(directory)
+    game = engine.ArrayMinesweeper(difficulty=difficulty)
+    for seed in seeds:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            board = game.get_info_snapshot()
+            for x, y in game.apply_moves(*game.get_AI_input(game.available_info())).moves:
+                game.save_turn([x, y], board)
+    game.database.close()
+    return str(directory / engine.TURN_LOG_FILENAME.format(width=game.width, height=game.height))
+
+
+def get_counts(mines):
+    """Returns the number of adjacent mines of every box of a (turns, width, height) batch"""
+    padded = np.pad(mines, ((0, 0), (1, 1), (1, 1))).astype(np.int8)
+    width, height = mines.shape[1:]
+    return sum(padded[:, 1 + i:1 + i + width, 1 + j:1 + j + height]
+               for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j)
+
+
+def test_mine_layouts_turn_with_their_boards(tmp_path, monkeypatch):
+    filename = write_logs(monkeypatch, tmp_path, engine.BEGINNER, range(30))
+    turns = 0
+    for boards, moves, scores, mines in dataset.iter_batches(filename, 16, shuffle_buffer=64, seed=0,
+                                                             augment_symmetries=True, mines=True):
+        revealed = (boards >= 0) & (boards < engine.MINE_VALUE)
+        assert not mines[revealed].any()
+        assert (boards[revealed] == get_counts(mines)[revealed]).all()
+        assert (boards[np.arange(len(moves)), moves[:, 0], moves[:, 1]] == engine.HIDDEN).all()
+        assert (scores > 0).all()
+        turns += len(boards)
+    assert turns > 0
+
+
+def test_version_1_logs_have_no_mine_layouts(tmp_path):
+    filename = str(tmp_path / 'data.turns')
+    with open(filename, 'wb') as log_file:
+        log_file.write(turnlog.HEADER.pack(turnlog.MAGIC, 1, 8, 8))
+        log_file.write(np.ones(4, dtype=turnlog.get_record_dtype(8, 8, version=1)).tobytes())
+
+    assert len(list(dataset.iter_batches(filename, 2))) == 2
+    with pytest.raises(ValueError):
+        list(dataset.iter_batches(filename, 2, mines=True))
+
+
+@pytest.mark.parametrize('shape', [(6, 6), (6, 4)])
+def test_deduplicate_drops_symmetric_copies(shape):
+    rng = np.random.RandomState(0)
+    boards = rng.randint(-2, 9, size=(200,) + shape).astype(np.int8)
+    moves = np.stack([rng.randint(0, shape[0], 200), rng.randint(0, shape[1], 200)], axis=1)
+    scores = np.arange(200, dtype=np.float32)
+    keys = dataset.get_canonical_keys(boards, moves)
+    assert len(np.unique(keys)) == 200
+
+    # every turn again under a random symmetry, then in a second block together with new turns
+    copies = dataset.augment(boards, moves, rng)
+    assert (dataset.get_canonical_keys(*copies) == keys).all()
+    blocks = [(boards[:150], moves[:150], scores[:150]),
+              (np.concatenate([copies[0], boards[150:]]), np.concatenate([copies[1], moves[150:]]),
+               np.concatenate([scores, scores[150:]]))]
+
+    kept = list(dataset.deduplicate(iter(blocks)))
+    assert (kept[0][2] == scores[:150]).all() and (kept[1][2] == scores[150:]).all()
+
+    # with room for fewer keys than a block holds, memory starts over instead of growing
+    kept = list(dataset.deduplicate(iter(blocks), max_seen=100))
+    assert sum(len(block[0]) for block in kept) >= 200
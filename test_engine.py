@@ -0,0 +1,262 @@
+"""Checks of the list and array engines over seeded games
+
+    python -m pytest -q
+"""
+from collections import deque
+
+import numpy as np
+import pytest
+
+import boards
+import engine
+import turnlog
+
+GAME_CLASSES = [engine.Minesweeper, engine.ArrayMinesweeper]
+SEEDS = range(20)
+
+
+def get_mines(game):
+    """Returns the game's mine layout as a (width, height) bool array"""
+    return game.get_mine_bitmap().reshape(game.width, game.height)
+
+
+def get_counts(mines):
+    """Returns the number of adjacent mines of every box"""
+    padded = np.pad(mines, 1).astype(np.int8)
+    width, height = mines.shape
+    return sum(padded[1 + i:1 + i + width, 1 + j:1 + j + height]
+               for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j)
+
+
+def get_expected_reveal(mines, x, y):
+    """Returns the boxes a click on the safe box (x, y) reveals, found by a plain breadth-first search"""
+    counts = get_counts(mines)
+    width, height = mines.shape
+    revealed = {(x, y)}
+    queue = deque([(x, y)])
+    while queue:
+        x, y = queue.popleft()
+        if counts[x, y]:
+            continue
+        for i in range(max(x - 1, 0), min(x + 2, width)):
+            for j in range(max(y - 1, 0), min(y + 2, height)):
+                if (i, j) not in revealed:
+                    revealed.add((i, j))
+                    queue.append((i, j))
+    return revealed
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_flood_fill_reveals_connected_zero_region(game_class):
+    game = game_class(difficulty=engine.EXPERT)
+    for seed in SEEDS:
+        game.new_game(seed)
+        mines = get_mines(game)
+        zeros = np.argwhere(~mines & (get_counts(mines) == 0))
+        x, y = map(int, zeros[len(zeros) // 2])
+
+        expected = get_expected_reveal(mines, x, y)
+        assert game.apply_moves([(x, y)]).revealed == expected, seed
+        assert set(map(tuple, np.argwhere(np.array(game.revealed_boxes)).tolist())) == expected, seed
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_flood_fill_of_a_huge_region_does_not_recurse(game_class):
+    game = game_class(difficulty=(400, 300, 1))
+    game.new_game(0)
+    mines = get_mines(game)
+    x, y = map(int, np.argwhere(~mines & (get_counts(mines) == 0))[0])
+
+    game.apply_moves([(x, y)])
+    assert game.is_game_won()
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_counters_match_board(game_class):
+    game = game_class(difficulty=engine.INTERMEDIATE)
+    rng = np.random.RandomState(0)
+    for seed in SEEDS:
+        game.new_game(seed)
+        mines = get_mines(game)
+        while not (game.mine_hit or game.is_game_won()):
+            reveals, flags = game.get_AI_input(game.available_info())
+            flags = list(flags) + [tuple(square) for square in rng.randint(0, game.width, size=(2, 2))]
+            game.apply_moves(reveals, flags)
+
+            revealed = np.array(game.revealed_boxes)
+            flagged = np.array(game.flagged_mines)
+            assert game.revealed_count == np.count_nonzero(revealed & ~mines), seed
+            assert game.flag_count == np.count_nonzero(flagged), seed
+            assert game.mines_remaining() == game.mines - np.count_nonzero(flagged), seed
+            assert game.mine_hit == bool((revealed & mines).any()), seed
+            assert game.is_game_won() == (not game.mine_hit and revealed[~mines].all()), seed
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_apply_moves_skips_repeats_and_stops_at_first_mine(game_class):
+    game = game_class(difficulty=engine.EXPERT)
+    for seed in SEEDS:
+        game.new_game(seed)
+        mines = get_mines(game)
+        first, flagged, last = map(tuple, np.argwhere(~mines & (get_counts(mines) > 0))[:3].tolist())
+        mine = tuple(np.argwhere(mines)[0].tolist())
+
+        result = game.apply_moves([first, first], [flagged, flagged, last])
+        assert result.moves == [first] and result.revealed == {first}, seed
+        assert game.flagged_mines[flagged[0]][flagged[1]] and game.flagged_mines[last[0]][last[1]], seed
+        assert game.flag_count == 2 and game.revealed_count == 1, seed
+
+        result = game.apply_moves([first, mine, last])
+        assert result.moves == [mine] and result.mine_hit and not result.won, seed
+        assert not game.revealed_boxes[last[0]][last[1]], seed
+        assert game.turns == [([first, first], [flagged, flagged, last]), ([first, mine, last], [])], seed
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_logged_turns_hold_the_board_each_move_was_chosen_on(tmp_path, monkeypatch, game_class):
+    monkeypatch.setattr(engine, 'LOG_TO_FILE', True)
+    monkeypatch.chdir(tmp_path)
+    game = game_class(difficulty=engine.BEGINNER)
+    boards = []
+    moves = []
+    for seed in SEEDS:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            board = game.get_info_snapshot()
+            result = game.apply_moves(*game.get_AI_input(game.available_info()))
+            for move in result.moves:
+                game.save_turn(move, board)
+                boards.append(board)
+                moves.append(move)
+    game.database.close()
+
+    records = turnlog.read_turn_log(engine.TURN_LOG_FILENAME.format(width=game.width, height=game.height))
+    assert (records['board'] == boards).all()
+    assert (records['move'] == moves).all()
+    moved = records['board'][np.arange(len(moves)), records['move'][:, 0], records['move'][:, 1]]
+    assert (moved == engine.HIDDEN).all()
+
+
+@pytest.mark.parametrize('first_click', ['safe', 'zero'])
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_first_click_rules(monkeypatch, game_class, first_click):
+    monkeypatch.setattr(engine, 'FIRST_CLICK', first_click)
+    game = game_class(difficulty=engine.EXPERT)
+    rng = np.random.RandomState(0)
+    for seed in SEEDS:
+        game.new_game(seed)
+        x, y = map(int, rng.randint(0, (game.width, game.height)))
+        game.apply_moves([(x, y)])
+        mines = get_mines(game)
+        assert not game.mine_hit and np.count_nonzero(mines) == game.mines, seed
+        if first_click == 'zero':
+            assert get_counts(mines)[x, y] == 0, seed
+
+
+@pytest.mark.parametrize('first_click', [None, 'safe'])
+def test_seeded_boards_repeat_across_engines(monkeypatch, first_click):
+    monkeypatch.setattr(engine, 'FIRST_CLICK', first_click)
+    games = [game_class(difficulty=engine.INTERMEDIATE) for game_class in GAME_CLASSES]
+    for seed in SEEDS:
+        layouts = []
+        for game in games + games:
+            game.new_game(seed)
+            game.apply_moves([(3, 5)])
+            layouts.append(get_mines(game))
+        assert all((layout == layouts[0]).all() for layout in layouts), seed
+
+
+def test_board_pool_round_trip(tmp_path):
+    filename = str(tmp_path / 'expert.boards')
+    width, height, mines = engine.EXPERT
+    boards.write_board_pool(filename, width, height, mines, 50, seed=0)
+    (pool_width, pool_height, pool_mines), records = boards.load_board_pool(filename)
+    assert (pool_width, pool_height, pool_mines) == engine.EXPERT and len(records) == 50
+
+    game = engine.ArrayMinesweeper(difficulty=engine.EXPERT)
+    for mine_squares in boards.iter_board_pool(filename):
+        assert len(mine_squares) == mines
+        game.new_game(0, mine_squares)
+        assert (np.flatnonzero(game.get_mine_bitmap()) == mine_squares).all()
+
+
+def get_state(game):
+    """Returns everything a rollback has to restore, as comparable values"""
+    return (np.array(game.available_info()).tolist(), np.array(game.revealed_boxes).tolist(),
+            np.array(game.flagged_mines).tolist(), get_mines(game).tolist(), game.mines_placed,
+            game.revealed_count, game.flag_count, game.mine_hit, list(game.changed_squares), list(game.turns),
+            game.rng.getstate())
+
+
+def play_turns(game, count, rng):
+    """Plays up to count AI turns, toggling a random flag on each"""
+    for _ in range(count):
+        if game.mine_hit or game.is_game_won():
+            return
+        reveals, flags = game.get_AI_input(game.available_info())
+        game.apply_moves(reveals, list(flags) + [tuple(rng.randint(0, (game.width, game.height)).tolist())])
+
+
+@pytest.mark.parametrize('first_click', [None, 'zero'])
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_nested_rollbacks_restore_the_game(monkeypatch, game_class, first_click):
+    monkeypatch.setattr(engine, 'FIRST_CLICK', first_click)
+    game = game_class(difficulty=engine.INTERMEDIATE)
+    rng = np.random.RandomState(0)
+    for seed in SEEDS:
+        game.new_game(seed)
+        states = []
+        checkpoints = []
+        for turns in (0, 3, 5):
+            play_turns(game, turns, rng)
+            states.append(get_state(game))
+            checkpoints.append(game.checkpoint())
+        play_turns(game, 100, rng)
+
+        for checkpoint, state in zip(reversed(checkpoints), reversed(states)):
+            game.rollback(checkpoint)
+            assert get_state(game) == state, seed
+            game.release(checkpoint)
+        assert game.journal is None
+
+        # the game goes on from the restored state as if nothing happened
+        play_turns(game, 100, rng)
+        assert np.count_nonzero(get_mines(game)) == game.mines, seed
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_hypothetical_moves_leave_the_game_untouched(game_class):
+    game = game_class(difficulty=engine.INTERMEDIATE)
+    for seed in SEEDS:
+        game.new_game(seed)
+        play_turns(game, 2, np.random.RandomState(seed))
+        if game.mine_hit or game.is_game_won():
+            continue
+        state = get_state(game)
+
+        # a real mine is harmless on a board without mines
+        mine = tuple(np.argwhere(get_mines(game) & ~np.array(game.revealed_boxes))[0].tolist())
+        with game.hypothetical(game.get_minefield([])):
+            result = game.apply_moves([mine])
+            assert result.moves == [mine] and not result.mine_hit, seed
+        assert get_state(game) == state, seed
+
+        with game.hypothetical():
+            play_turns(game, 100, np.random.RandomState(seed))
+        assert get_state(game) == state, seed
+
+
+@pytest.mark.parametrize('size', [(1, 1), (1, 7), (5, 3), (30, 16)])
+def test_neighbour_table_matches_brute_force(size):
+    width, height = size
+    table = engine.get_neighbour_table(width, height)
+    assert engine.get_neighbour_table(width, height) is table
+    for x in range(width):
+        for y in range(height):
+            expected = {(i, j) for i in range(x - 1, x + 2) for j in range(y - 1, y + 2)
+                        if 0 <= i < width and 0 <= j < height and (i, j) != (x, y)}
+            assert len(table.get_squares(x, y)) == len(expected) and set(table.get_squares(x, y)) == expected
+
+    squares = [(x, y) for x in range(0, width, 2) for y in range(0, height, 3)]
+    expected = set(squares).union(*[table.get_squares(x, y) for x, y in squares])
+    assert table.get_neighbourhood(squares) == expected
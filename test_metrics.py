@@ -0,0 +1,88 @@
+"""Checks of the hot-path metrics: recording, snapshots, merging and Prometheus output
+
+    python -m pytest -q
+"""
+import json
+
+import pytest
+
+import engine
+import metrics
+
+
+@pytest.fixture
+def recording():
+    """Records metrics from scratch for one test, leaves them disabled and empty afterwards"""
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def play_games(seeds):
+    """Plays the AI on seeded EXPERT boards from fresh metrics, ending the last game"""
+    game = engine.ArrayMinesweeper(difficulty=engine.EXPERT)
+    metrics.reset()  # the board the constructor deals is not one of the games
+    for seed in seeds:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            game.apply_moves(*game.get_AI_input(game.available_info()))
+    metrics.end_game()
+
+
+def test_disabled_metrics_record_nothing():
+    play_games(range(2))
+    assert metrics.snapshot() == {'counters': {}, 'timings': {}}
+
+
+def test_snapshot_counts_games_and_phases(recording):
+    play_games(range(5))
+    data = json.loads(json.dumps(metrics.snapshot()))
+
+    assert data['counters']['games'] == 5
+    assert data['counters']['reveals'] > 0
+    for phase in ('apply_moves', 'game.apply_moves', 'flood_fill'):
+        timing = data['timings'][phase]
+        assert timing['calls'] > 0 and timing['seconds'] > 0
+        assert sum(timing['histogram']) == timing['calls']
+    assert data['timings']['game.apply_moves']['calls'] == 5
+
+
+def test_merged_snapshots_add_up(recording):
+    play_games(range(3))
+    first = metrics.snapshot()
+    play_games(range(3, 5))
+    second = metrics.snapshot()
+
+    total = {'counters': {}, 'timings': {}}
+    metrics.merge_snapshot(total, first)
+    metrics.merge_snapshot(total, second)
+    assert total['counters']['games'] == 5
+    for phase in set(first['timings']) | set(second['timings']):
+        parts = [data['timings'][phase] for data in (first, second) if phase in data['timings']]
+        assert total['timings'][phase]['calls'] == sum(part['calls'] for part in parts)
+        histograms = zip(*[part['histogram'] for part in parts])
+        assert total['timings'][phase]['histogram'] == [sum(calls) for calls in histograms]
+
+
+def test_prometheus_output(recording, tmp_path):
+    metrics.count('solver.pattern_hits', 3)
+    for seconds in (1e-6, 2e-6, 1e-3):
+        metrics.record('apply_moves', seconds)
+    filename = str(tmp_path / 'metrics.prom')
+    metrics.write_snapshot(filename)
+    with open(filename) as snapshot_file:
+        lines = snapshot_file.read().splitlines()
+
+    assert '# TYPE minesweeper_solver_pattern_hits_total counter' in lines
+    assert 'minesweeper_solver_pattern_hits_total 3' in lines
+    assert '# TYPE minesweeper_phase_seconds histogram' in lines
+    buckets = [line for line in lines if line.startswith('minesweeper_phase_seconds_bucket{phase="apply_moves"')]
+    counts = [int(line.split()[-1]) for line in buckets]
+    bounds = [line.split('le="')[1].split('"')[0] for line in buckets]
+    assert counts == sorted(counts) and counts[-1] == 3 and bounds[-1] == '+Inf'
+    assert [float(bound) for bound in bounds[:-1]] == sorted(float(bound) for bound in bounds[:-1])
+    assert 'minesweeper_phase_seconds_count{phase="apply_moves"} 3' in lines
+    total = float(next(line for line in lines if line.startswith('minesweeper_phase_seconds_sum')).split()[-1])
+    assert total == pytest.approx(1.003e-3)
@@ -0,0 +1,70 @@
+"""Checks that recorded games replay to the same boards and results
+
+    python -m pytest -q
+"""
+import pytest
+
+import engine
+import replay
+
+GAME_CLASSES = [engine.Minesweeper, engine.ArrayMinesweeper]
+SEEDS = range(20)
+
+
+def play(game):
+    """Plays the game's AI to the end of the current game"""
+    while not (game.mine_hit or game.is_game_won()):
+        game.apply_moves(*game.get_AI_input(game.available_info()))
+
+
+@pytest.mark.parametrize('first_click', [None, 'zero'])
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_replays_verify(tmp_path, monkeypatch, game_class, first_click):
+    monkeypatch.setattr(engine, 'FIRST_CLICK', first_click)
+    filename = str(tmp_path / 'games.replay')
+    writer = replay.ReplayWriter(filename)
+    game = game_class(difficulty=engine.INTERMEDIATE)
+    for seed in SEEDS:
+        game.new_game(seed)
+        play(game)
+        writer.write_game(game)
+    writer.close()
+
+    replays = list(replay.read_replays(filename))
+    assert len(replays) == len(SEEDS)
+    for recording in replays:
+        assert replay.replay_game(game, recording, verify=True) is None, recording.seed
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_replays_rebuild_the_final_board(tmp_path, game_class):
+    filename = str(tmp_path / 'games.replay')
+    writer = replay.ReplayWriter(filename)
+    game = game_class(difficulty=engine.EXPERT)
+    boards = []
+    for seed in SEEDS:
+        game.new_game(seed)
+        play(game)
+        writer.write_game(game)
+        boards.append(game.get_info_snapshot())
+    writer.close()
+
+    for recording, board in zip(replay.read_replays(filename), boards):
+        replay.replay_game(game, recording)
+        assert (game.get_info_snapshot() == board).all(), recording.seed
+
+
+def test_verify_stops_at_a_changed_turn(tmp_path):
+    filename = str(tmp_path / 'games.replay')
+    writer = replay.ReplayWriter(filename)
+    game = engine.ArrayMinesweeper(difficulty=engine.INTERMEDIATE)
+    game.new_game(0)
+    play(game)
+    writer.write_game(game)
+    writer.close()
+
+    recording, = replay.read_replays(filename)
+    turn = len(recording.turns) // 2
+    reveals, flags = recording.turns[turn]
+    changed = recording._replace(turns=recording.turns[:turn] + [(reveals, flags + [(0, 0)])])
+    assert replay.replay_game(game, changed, verify=True) == turn
@@ -0,0 +1,49 @@
+"""Checks of the game server against local games over a Unix socket
+
+    python -m pytest -q
+"""
+import asyncio
+
+import numpy as np
+
+import engine
+import server
+
+SEEDS = range(20)
+
+
+def test_server_matches_local_engine(tmp_path):
+    async def play_remote(client, seed, difficulty):
+        local_game = engine.ArrayMinesweeper(difficulty=difficulty)
+        local_game.new_game(seed)
+        session = await client.create(difficulty, seed)
+        board = np.full(difficulty[:2], engine.HIDDEN, dtype=np.int8)
+        while True:
+            reveals, flags = local_game.get_AI_input(local_game.available_info())
+            result = local_game.apply_moves(reveals, flags)
+            status, changes = await client.moves(session, [tuple(map(int, square)) for square in reveals],
+                                                 [tuple(map(int, square)) for square in flags])
+            board[changes['x'], changes['y']] = changes['value']
+            assert (board == local_game.available_info()).all(), seed
+            if status != server.PLAYING:
+                assert (status == server.WON) == result.won
+                assert (await client.board(session) == local_game.available_info()).all()
+                await client.close_session(session)
+                return
+
+    async def run():
+        unix_path = str(tmp_path / 'server.sock')
+        serving = asyncio.ensure_future(server.serve(unix_path))
+        try:
+            for _ in range(100):
+                if (tmp_path / 'server.sock').exists():
+                    break
+                await asyncio.sleep(0.01)
+            client = await server.GameClient.connect(unix_path)
+            await asyncio.gather(*[play_remote(client, seed, engine.EXPERT if seed % 2 else engine.BEGINNER)
+                                   for seed in SEEDS])
+            await client.close()
+        finally:
+            serving.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,170 @@
+"""Checks of the solvers' deductions and guesses over seeded games
+
+    python -m pytest -q
+"""
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import engine
+import solver
+
+GAME_CLASSES = [engine.Minesweeper, engine.ArrayMinesweeper]
+SEEDS = range(20)
+
+
+@pytest.mark.parametrize('ai_mode', ['frontier', 'constraint', 'probability'])
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_certain_moves_are_never_wrong(game_class, ai_mode):
+    game = game_class(ai_mode, difficulty=engine.EXPERT)
+    certain = 0
+    for seed in SEEDS:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            info = game.available_info()
+            game.solver.update(game.changed_squares)
+            game.changed_squares = []
+            safe, mines = game.solver.get_certain_squares(info)
+            assert not any(game.is_there_mine(game.mine_field, x, y) for x, y in safe), seed
+            assert all(game.is_there_mine(game.mine_field, x, y) for x, y in mines), seed
+            certain += len(safe) + len(mines)
+
+            if not safe and not mines:
+                safe = {game.solver.get_guess(info)}
+            game.apply_moves(safe, mines)
+    assert certain > 0
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_components_share_no_squares(game_class):
+    game = game_class('constraint', difficulty=engine.EXPERT)
+    for seed in SEEDS:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            game.apply_moves(*game.get_AI_input(game.available_info()))
+
+            components = game.solver.get_components()
+            squares = [set().union(*[constraint[0] for constraint in component]) for component in components]
+            assert sum(map(len, squares)) == len(set().union(*squares)), seed
+            assert sum(map(len, components)) == len(set(game.solver.constraints.values())), seed
+
+
+def get_layouts(width, height, mines):
+    """Returns every (layouts, width, height) mine layout of a field and the adjacent mine counts of its boxes"""
+    squares = np.array(list(itertools.combinations(range(width * height), mines)))
+    layouts = np.zeros((len(squares), width * height), dtype=np.bool_)
+    np.put_along_axis(layouts, squares, True, axis=1)
+    layouts = layouts.reshape(-1, width, height)
+
+    padded = np.pad(layouts, ((0, 0), (1, 1), (1, 1))).astype(np.int8)
+    counts = sum(padded[:, 1 + i:1 + i + width, 1 + j:1 + j + height]
+                 for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j)
+    return layouts, counts
+
+
+def get_layout_probabilities(info, layouts, counts):
+    """Returns the mine probability of every box over the layouts that agree with the board"""
+    info = np.array(info)
+    revealed = (info >= 0) & (info != engine.MINE_VALUE)
+    flagged = info == engine.FLAGGED
+    consistent = ((~layouts[:, revealed]).all(axis=1) & (counts[:, revealed] == info[revealed]).all(axis=1)
+                  & layouts[:, flagged].all(axis=1))
+    return layouts[consistent].mean(axis=0)
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_probabilities_match_brute_force(game_class):
+    game = game_class('probability', difficulty=(5, 5, 5))
+    layouts, counts = get_layouts(game.width, game.height, game.mines)
+    checked = 0
+    for seed in SEEDS:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            info = game.available_info()
+            game.solver.update(game.changed_squares)
+            game.changed_squares = []
+            safe, mines = game.solver.get_certain_squares(info)
+
+            distributions = [solver.get_component_distribution(component, game.rng)
+                             for component in game.solver.get_components()]
+            frontier = set().union(*[squares for squares, _ in distributions])
+            interior_count = game.width * game.height - game.revealed_count - game.flag_count - len(frontier)
+            probabilities, interior_probability = game.solver.get_probabilities(
+                distributions, interior_count, game.mines - game.flag_count)
+
+            expected = get_layout_probabilities(info, layouts, counts)
+            for (x, y), probability in probabilities.items():
+                assert probability == pytest.approx(expected[x, y]), seed
+            for x, y in zip(*np.nonzero(np.array(info) == engine.HIDDEN)):
+                if (x, y) not in frontier:
+                    assert interior_probability == pytest.approx(expected[x, y]), seed
+            checked += len(probabilities)
+
+            if not safe and not mines:
+                safe = {game.solver.get_guess(info)}
+            game.apply_moves(safe, mines)
+    assert checked > 0
+
+
+def test_pattern_keys_hash_the_window_only():
+    rng = np.random.RandomState(0)
+    info = rng.randint(engine.FLAGGED, engine.MINE_VALUE + 1, size=(20, 20)).tolist()
+    key = solver.get_pattern_key(info, 5, 6, 20, 20)
+
+    # the same window anywhere on the board has the same key
+    moved = np.full((20, 20), engine.HIDDEN)
+    moved[10:15, 11:16] = np.array(info)[3:8, 4:9]
+    assert solver.get_pattern_key(moved.tolist(), 12, 13, 20, 20) == key
+
+    info[5][9] = engine.MINE_VALUE if info[5][9] != engine.MINE_VALUE else 0
+    assert solver.get_pattern_key(info, 5, 6, 20, 20) == key
+    info[7][8] = engine.MINE_VALUE if info[7][8] != engine.MINE_VALUE else 0
+    assert solver.get_pattern_key(info, 5, 6, 20, 20) != key
+
+    # boxes past the edge hash differently from every box state
+    keys = {solver.get_pattern_key(np.full((5, 5), value).tolist(), 0, 0, 5, 5)
+            for value in range(engine.FLAGGED, engine.MINE_VALUE + 1)}
+    assert len(keys) == engine.MINE_VALUE - engine.FLAGGED + 1
+
+
+@pytest.mark.parametrize('game_class', GAME_CLASSES)
+def test_cached_patterns_match_fresh_deductions(monkeypatch, game_class):
+    monkeypatch.setattr(solver, 'PATTERN_CACHE', OrderedDict())
+    game = game_class('constraint', difficulty=engine.EXPERT)
+    hits = 0
+    for seed in SEEDS:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            info = game.available_info()
+            for x, y in game.solver.frontier:
+                deductions = solver.PATTERN_CACHE.get(solver.get_pattern_key(info, x, y, game.width, game.height))
+                if deductions is not None:
+                    assert deductions == solver.get_pattern_deductions(info, x, y, game.width, game.height), seed
+                    hits += 1
+            game.apply_moves(*game.get_AI_input(info))
+    assert hits > 0
+
+
+def test_pattern_cache_save_and_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(solver, 'PATTERN_CACHE', OrderedDict())
+    game = engine.ArrayMinesweeper('constraint', difficulty=engine.EXPERT)
+    for seed in SEEDS:
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            game.apply_moves(*game.get_AI_input(game.available_info()))
+    patterns = list(solver.PATTERN_CACHE.items())
+    assert any(safe or mines for _, (safe, mines) in patterns)
+
+    filename = str(tmp_path / 'patterns.npy')
+    solver.save_pattern_cache(filename)
+    monkeypatch.setattr(solver, 'PATTERN_CACHE', OrderedDict())
+    solver.load_pattern_cache(filename)
+    loaded = [(key, tuple(map(set, deductions))) for key, deductions in solver.PATTERN_CACHE.items()]
+    assert loaded == [(key, tuple(map(set, deductions))) for key, deductions in patterns]
+
+    # loaded patterns are most recently used, the oldest are evicted past PATTERN_CACHE_SIZE
+    monkeypatch.setattr(solver, 'PATTERN_CACHE_SIZE', 10)
+    solver.load_pattern_cache(filename)
+    assert list(solver.PATTERN_CACHE) == [key for key, _ in patterns[-10:]]
@@ -0,0 +1,151 @@
+"""Checks of the binary and JSON turn logs
+
+    python -m pytest -q
+"""
+import json
+
+import numpy as np
+import pytest
+
+import chunked
+import engine
+import turnlog
+
+WIDTH, HEIGHT = 9, 7
+
+
+def get_turns(count, seed=0):
+    """Returns (boards, moves, scores, packed mine layouts) of count random turns"""
+    rng = np.random.RandomState(seed)
+    boards = rng.randint(-2, 10, size=(count, WIDTH, HEIGHT)).astype(np.int8)
+    moves = rng.randint(0, HEIGHT, size=(count, 2))
+    scores = rng.rand(count).astype(np.float32)
+    mines = np.packbits(rng.rand(count, WIDTH * HEIGHT) < 0.2, axis=1)
+    return boards, moves, scores, mines
+
+
+def test_binary_log_round_trip(tmp_path):
+    filename = str(tmp_path / 'data.turns')
+    boards, moves, scores, mines = get_turns(3 * turnlog.INITIAL_BUFFER_RECORDS)
+    log = turnlog.BinaryTurnLog(filename, WIDTH, HEIGHT)
+    for i in range(len(boards)):
+        log.append(boards[i], moves[i], scores[i], mines[i])
+        if i == 10:
+            log.flush()
+    log.close()
+
+    records = turnlog.read_turn_log(filename)
+    assert isinstance(records, np.memmap) and not records.flags.writeable
+    assert (records['board'] == boards).all()
+    assert (records['move'] == moves).all()
+    assert (records['score'] == scores).all()
+    assert (records['mines'] == mines).all()
+
+
+def test_binary_log_appends_to_a_log_of_its_size(tmp_path):
+    filename = str(tmp_path / 'data.turns')
+    boards, moves, scores, mines = get_turns(20)
+    for start in (0, 10):
+        log = turnlog.BinaryTurnLog(filename, WIDTH, HEIGHT)
+        for i in range(start, start + 10):
+            log.append(boards[i], moves[i], scores[i], mines[i])
+        log.close()
+    assert (turnlog.read_turn_log(filename)['board'] == boards).all()
+
+    with pytest.raises(ValueError):
+        turnlog.BinaryTurnLog(filename, HEIGHT, WIDTH)
+
+
+def test_version_1_logs_are_read(tmp_path):
+    filename = str(tmp_path / 'data.turns')
+    boards, moves, scores, _ = get_turns(20)
+    records = np.zeros(len(boards), dtype=turnlog.get_record_dtype(WIDTH, HEIGHT, version=1))
+    records['board'] = boards
+    records['move'] = moves
+    records['score'] = scores
+    with open(filename, 'wb') as log_file:
+        log_file.write(turnlog.HEADER.pack(turnlog.MAGIC, 1, WIDTH, HEIGHT))
+        log_file.write(records.tobytes())
+
+    records = turnlog.read_turn_log(filename)
+    assert 'mines' not in records.dtype.names
+    assert (records['board'] == boards).all() and (records['move'] == moves).all()
+    assert (records['score'] == scores).all()
+
+    # appending would mix record sizes, a version 1 log is read only
+    with pytest.raises(ValueError):
+        turnlog.BinaryTurnLog(filename, WIDTH, HEIGHT)
+
+
+def test_json_log_round_trip(tmp_path):
+    filename = str(tmp_path / 'data.txt')
+    boards, moves, scores, mines = get_turns(5)
+    log = turnlog.JsonTurnLog(filename)
+    for i in range(len(boards)):
+        log.append(boards[i], moves[i].tolist(), float(scores[i]), mines[i])
+    log.close()
+
+    with open(filename) as log_file:
+        entries = [json.loads(line) for line in log_file]
+    assert [entry['turn'] for entry in entries] == boards.tolist()
+    assert [entry['move'] for entry in entries] == moves.tolist()
+    assert [entry['score'] for entry in entries] == scores.tolist()
+
+
+@pytest.mark.parametrize('game_class', [engine.Minesweeper, engine.ArrayMinesweeper])
+@pytest.mark.parametrize('log_format', ['binary', 'json'])
+def test_games_log_their_mine_layout(tmp_path, monkeypatch, game_class, log_format):
+    monkeypatch.setattr(engine, 'LOG_TO_FILE', True)
+    monkeypatch.setattr(engine, 'LOG_FORMAT', log_format)
+    monkeypatch.setattr(engine, 'FIRST_CLICK', 'zero')
+    monkeypatch.chdir(tmp_path)
+    game = game_class(difficulty=engine.BEGINNER)
+    layouts = []
+    for seed in range(10):
+        game.new_game(seed)
+        while not (game.mine_hit or game.is_game_won()):
+            board = game.get_info_snapshot()
+            for x, y in game.apply_moves(*game.get_AI_input(game.available_info())).moves:
+                game.save_turn([x, y], board)
+                layouts.append(game.get_mine_bitmap())
+    game.database.close()
+
+    if log_format == 'binary':
+        records = turnlog.read_turn_log(engine.TURN_LOG_FILENAME.format(width=game.width, height=game.height))
+        logged = turnlog.get_mine_layers(records).reshape(len(records), -1)
+        assert (logged == layouts).all()
+    else:
+        with open(engine.DATABASE_FILENAME) as log_file:
+            logged = [json.loads(line)['mines'] for line in log_file]
+        assert logged == [np.flatnonzero(layout).tolist() for layout in layouts]
+
+
+def test_chunked_mine_layout_creates_no_chunks():
+    game = chunked.ChunkedMinesweeper(difficulty=(37, 29, 150), chunk_size=8)
+    game.new_game(0)
+    bitmap = game.get_mine_bitmap().reshape(game.width, game.height)
+    assert not game.mine_field.get_keys()
+
+    field = np.array([[game.mine_field[x][y] for y in range(game.height)] for x in range(game.width)])
+    assert (bitmap == (field == engine.MINE_VALUE)).all()
+
+
+def test_games_of_several_sizes_log_side_by_side(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'LOG_TO_FILE', True)
+    monkeypatch.chdir(tmp_path)
+    games = [engine.Minesweeper(difficulty=difficulty) for difficulty in (engine.TEST, engine.EXPERT, engine.TEST)]
+    moves = {}
+    for seed in range(5):
+        for game in games:
+            game.new_game(seed)
+            while not (game.mine_hit or game.is_game_won()):
+                board = game.get_info_snapshot()
+                for x, y in game.apply_moves(*game.get_AI_input(game.available_info())).moves:
+                    game.save_turn([x, y], board)
+                    moves[game.width, game.height] = moves.get((game.width, game.height), 0) + 1
+    for game in games:
+        game.database.close()
+
+    for (width, height), count in moves.items():
+        records = turnlog.read_turn_log(engine.TURN_LOG_FILENAME.format(width=width, height=height))
+        assert records.dtype['board'].shape == (width, height) and len(records) == count
@@ -0,0 +1,124 @@
+"""Turn logs written by Minesweeper.save_turn
+
+The binary format is a header followed by fixed-size records (int8 board observation, move, float32 score and
+the game's mine layout packed eight boxes per byte), so a log can be memory-mapped and read without parsing.
+Version 1 logs, written before the mine layout was recorded, can still be read. The JSON format keeps the
+original one object per line, with the mine squares added as flat x * height + y indices.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'MSTL'
+VERSION = 2
+READABLE_VERSIONS = (1, 2)  # version 1 records have no mine layout
+HEADER = struct.Struct('<4sBHH')  # magic, version, width, height
+INITIAL_BUFFER_RECORDS = 256
+
+
+def get_record_dtype(width, height, version=VERSION):
+    """Returns the structured dtype of one turn on a width x height field"""
+    fields = [
+        ('board', np.int8, (width, height)),
+        ('move', '<i2', (2,)),
+        ('score', '<f4'),
+    ]
+    if version >= 2:
+        fields.append(('mines', np.uint8, (-(-width * height // 8),)))  # flat x * height + y, eight per byte
+    return np.dtype(fields)
+
+
+def read_header(log_file):
+    """Returns (width, height, version) from an open binary turn log"""
+    magic, version, width, height = HEADER.unpack(log_file.read(HEADER.size))
+    if magic != MAGIC or version not in READABLE_VERSIONS:
+        raise ValueError('{} is not a version {} turn log'.format(log_file.name, VERSION))
+    return width, height, version
+
+
+def get_mine_layers(records):
+    """Returns the mine layouts of version 2 records as a (turns, width, height) uint8 array of 0/1"""
+    width, height = records.dtype['board'].shape
+    mines = np.unpackbits(records['mines'], axis=1, count=width * height)
+    return mines.reshape(len(records), width, height)
+
+
+class BinaryTurnLog:
+    """Appends fixed-size turn records to a binary log, buffered in memory until flush"""
+
+    def __init__(self, filename, width, height):
+        self.dtype = get_record_dtype(width, height)
+
+        if os.path.exists(filename) and os.path.getsize(filename):
+            with open(filename, 'rb') as log_file:
+                if read_header(log_file) != (width, height, VERSION):
+                    raise ValueError('{} holds turns of another field size or version'.format(filename))
+        # append mode, so games of the same size sharing the log never write over each other's turns
+        self.file = open(filename, 'ab')
+        if not self.file.tell():
+            self.file.write(HEADER.pack(MAGIC, VERSION, width, height))
+            self.file.flush()  # another game of this size opening the log next must see the header
+
+        self.buffer = np.zeros(INITIAL_BUFFER_RECORDS, dtype=self.dtype)
+        self.count = 0
+
+    def append(self, board, move, score, mines):
+        """Buffers one turn, mines being the game's flat x * height + y mine layout packed eight boxes per byte"""
+        if self.count == len(self.buffer):
+            self.buffer = np.concatenate([self.buffer, np.zeros(len(self.buffer), dtype=self.dtype)])
+
+        record = self.buffer[self.count]
+        record['board'] = board
+        record['move'] = move
+        record['score'] = score
+        record['mines'] = mines
+        self.count += 1
+
+    def flush(self):
+        """Writes buffered turns with a single write"""
+        if self.count:
+            self.file.write(self.buffer[:self.count].tobytes())
+            self.file.flush()
+            self.count = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class JsonTurnLog:
+    """Appends one JSON object per turn, buffered in memory until flush"""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'a')
+        self.lines = []
+
+    def append(self, board, move, score, mines):
+        """Buffers one turn, mines being the game's flat x * height + y mine layout packed eight boxes per byte"""
+        self.lines.append(json.dumps({
+            "turn": np.asarray(board).tolist(),
+            "move": list(move),
+            "score": score,
+            "mines": np.flatnonzero(np.unpackbits(mines)).tolist(),
+        }))
+
+    def flush(self):
+        """Writes buffered turns with a single write"""
+        if self.lines:
+            self.lines.append('')
+            self.file.write('\n'.join(self.lines))
+            self.file.flush()
+            self.lines = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_turn_log(filename):
+    """Returns the turns of a binary log as a read-only memory-mapped record array"""
+    with open(filename, 'rb') as log_file:
+        width, height, version = read_header(log_file)
+    return np.memmap(filename, dtype=get_record_dtype(width, height, version), mode='r', offset=HEADER.size)